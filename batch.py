@@ -0,0 +1,219 @@
+# batch.py: Resolução em lote de vários tabuleiros takuzu.
+# Os tabuleiros são lidos do standard input, um após o outro, no mesmo formato
+# aceite por takuzu.py, e podem ser distribuídos por vários processos.
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from corpus import Corpus, pack_board, write_packed
+from takuzu import MALFORMED, NO_SOLUTION, Board, solve
+
+
+# The solution databases used by this process, for each size (see use_databases)
+DATABASES = {}
+
+
+def use_databases(handles: dict) -> None:
+    """Attaches to the solution databases shared with the handles 'handles'
+    (see database.share_databases), which are then used to solve the boards
+    of their sizes instead of the search. It's the initializer of the worker
+    processes."""
+    from database import attach_databases
+    DATABASES.update(attach_databases(handles))
+
+
+def solve_chunk(chunk: list, profiler=None, packed: bool = False) -> tuple:
+    """Solves every (index, board) pair in 'chunk'. Returns the pid of the
+    process which solved them, the time it spent doing so and a list with the
+    (index, output) pair of each board. If 'packed', the output is a (size,
+    packed cells) pair (see corpus.pack_board) with the solution, or with the
+    board itself (which still has empty cells) if it doesn't have one. If a
+    profiler is given, it's running only while the boards are being solved.
+    Boards with a solution database (see use_databases) are looked up. The
+    malformed boards (the ValueErrors yielded in their place by
+    Board.parse_instances and Corpus.boards) get the output MALFORMED, or an
+    empty 0x0 board if 'packed'."""
+    start = time.perf_counter()
+    results = []
+    for index, board in chunk:
+        if isinstance(board, ValueError):
+            results.append((index, (0, b'') if packed else MALFORMED))
+            continue
+        if profiler is not None:
+            profiler.start()
+        database = DATABASES.get(board.size)
+        if database is not None:
+            solution = database.solve(board)
+        else:
+            goal, _ = solve(board)
+            solution = goal.state.board if goal else None
+        if profiler is not None:
+            profiler.stop()
+        if packed:
+            solution = solution or board
+            results.append((index, (solution.size, pack_board(solution))))
+        else:
+            results.append((index, str(solution) if solution else NO_SOLUTION))
+    return os.getpid(), time.perf_counter() - start, results
+
+
+def chunked(iterable, size: int):
+    """Yields lists with (up to) 'size' consecutive (index, item) pairs of
+    'iterable'."""
+    chunk = []
+    for pair in enumerate(iterable):
+        chunk.append(pair)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def solve_batch(boards, workers: int = 1, chunksize: int = 16, ordered: bool = True, stats=None,
+                profiler=None, packed: bool = False, databases: dict = None):
+    """Solves every board in 'boards' (an iterable, which is consumed lazily)
+    and yields an (index, output) pair for each one of them, where 'index' is
+    the position of the board in 'boards'.
+
+    The boards are sent to a pool of 'workers' processes in chunks of
+    'chunksize' boards, with at most a few chunks per worker in flight at any
+    given time. If 'ordered' is True the results are yielded in the same
+    order as the boards, otherwise they're yielded as soon as their chunk is
+    solved. If 'stats' is a dict, it's filled with the number of boards
+    solved and the time spent by each worker (indexed by its pid). A
+    profiler (see profiling.Profiler) can only be given with a single worker,
+    since the boards are then solved in this process. If 'packed', the
+    outputs are packed boards (see solve_chunk) instead of text. 'databases'
+    are the handles of the solution databases shared with the workers (see
+    use_databases), which attach to them when they start."""
+    if stats is None:
+        stats = {}
+    chunks = chunked(boards, chunksize)
+
+    def record(solved_chunk):
+        pid, elapsed, results = solved_chunk
+        solved, seconds = stats.get(pid, (0, 0.0))
+        stats[pid] = (solved + len(results), seconds + elapsed)
+        return results
+
+    if workers <= 1:
+        if databases:
+            use_databases(databases)
+        for chunk in chunks:
+            yield from record(solve_chunk(chunk, profiler, packed))
+        return
+    if profiler is not None:
+        raise ValueError("A profiler can only be used with a single worker")
+
+    window = workers * 4
+    initializer, initargs = (use_databases, (databases,)) if databases else (None, ())
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as executor:
+        pending = deque() if ordered else set()
+        submit = pending.append if ordered else pending.add
+        for chunk in chunks:
+            submit(executor.submit(solve_chunk, chunk, None, packed))
+            while len(pending) >= window:
+                yield from _collect(pending, ordered, record)
+        while pending:
+            yield from _collect(pending, ordered, record)
+
+
+def _collect(pending, ordered: bool, record):
+    """Waits for (at least) one of the 'pending' futures and yields its
+    results: the oldest one if 'ordered', otherwise any which is done."""
+    if ordered:
+        yield from record(pending.popleft().result())
+        return
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.remove(future)
+        yield from record(future.result())
+
+
+def report(stats: dict, elapsed: float, file=sys.stderr) -> None:
+    """Prints the throughput of each worker, and of the whole batch."""
+    total = 0
+    for pid, (solved, seconds) in sorted(stats.items()):
+        rate = solved / seconds if seconds else float('inf')
+        print("Worker {}: {} boards in {:.3f} s ({:.1f} boards/s)".format(
+            pid, solved, seconds, rate), file=file)
+        total += solved
+    rate = total / elapsed if elapsed else float('inf')
+    print("Total: {} boards in {:.3f} s ({:.1f} boards/s)".format(
+        total, elapsed, rate), file=file)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solves the takuzu boards read from the standard input.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: one per core)")
+    parser.add_argument('--chunksize', type=int, default=16,
+                        help="number of boards sent to a worker at a time")
+    parser.add_argument('--as-completed', action='store_true',
+                        help="print each solution as soon as it's found, "
+                             "preceded by the index of its board")
+    parser.add_argument('--quiet', action='store_true',
+                        help="don't report the throughput of each worker")
+    parser.add_argument('--corpus', metavar='FILE',
+                        help="read the boards from a binary corpus (see corpus.py) "
+                             "instead of the standard input")
+    parser.add_argument('--packed', metavar='FILE',
+                        help="write the solutions to a binary corpus (boards without "
+                             "one are written as given, and malformed ones as 0x0 boards) "
+                             "instead of printing them")
+    parser.add_argument('--database', metavar='DIRECTORY',
+                        help="look up the boards of the sizes with a solution database "
+                             "(see database.py) in DIRECTORY, which is shared by all "
+                             "the workers")
+    parser.add_argument('--profile', metavar='PREFIX',
+                        help="profile the solves (in a single worker), writing "
+                             "PREFIX.pstats and PREFIX.folded")
+    parser.add_argument('--profile-mode', choices=('cprofile', 'sample'), default='cprofile',
+                        help="trace every call with cProfile (default) or sample "
+                             "the stack periodically (no pstats)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    profiler = None
+    if args.profile:
+        from profiling import Profiler
+        profiler = Profiler(args.profile_mode)
+        args.workers = 1
+    stats = {}
+    start = time.perf_counter()
+    if args.corpus:
+        boards = Corpus(args.corpus).boards(errors=True)
+    else:
+        boards = Board.parse_instances(sys.stdin, errors=True)
+    shared = databases = None
+    if args.database:
+        from database import share_databases
+        from shared import SharedTables
+        shared = SharedTables()
+        databases = share_databases(args.database, shared)
+    packed = args.packed is not None
+    # The solutions are written in the order of the boards in a corpus
+    ordered = packed or not args.as_completed
+    results = solve_batch(boards, args.workers, args.chunksize, ordered, stats,
+                          profiler, packed, databases)
+    if packed:
+        write_packed(args.packed, (output for _, output in results))
+    else:
+        for index, output in results:
+            if args.as_completed:
+                print("#{}".format(index))
+            print(output + "\n")
+    if shared is not None:
+        shared.close()
+    if not args.quiet:
+        report(stats, time.perf_counter() - start)
+    if profiler is not None:
+        profiler.write(args.profile)
@@ -0,0 +1,320 @@
+# bench.py: Medição dos tempos de resolução das várias estratégias de procura.
+# Ao contrário de hyperfine.sh, os módulos são importados uma única vez e só é
+# medido o tempo da procura (sem o arranque do interpretador nem a leitura).
+
+import argparse
+import csv
+import gc
+import glob
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from functools import partial
+
+from portfolio import STRATEGIES
+from search import MemoryUsage
+from takuzu import Board, node_bytes, solve
+
+DEFAULT_INPUTS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              'testes-takuzu', 'input_T*')
+DEFAULT_STRATEGIES = ('depth_first_tree_search', 'breadth_first_tree_search',
+                      'greedy_search', 'astar_search')
+FIELDS = ('instance', 'size', 'strategy', 'solved', 'repeats', 'median', 'mean',
+          'stdev', 'min', 'max', 'succs', 'states', 'peak_memory', 'bytes_per_node',
+          'max_frontier')
+
+
+def load_instances(pattern: str = DEFAULT_INPUTS) -> list:
+    """Returns a (name, board) pair for every file matching 'pattern', where
+    the name is the suffix of the file name after 'input_' (e.g. 'T01')."""
+    instances = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path) as file:
+            board = next(Board.parse_instances(file))
+        instances.append((os.path.basename(path).replace('input_', ''), board))
+    return instances
+
+
+def measure(board: Board, search, repeats: int = 10, warmup: int = 2,
+            memory_interval: int = 10) -> dict:
+    """Solves 'board' with 'search' 'warmup' times (discarded) and then
+    'repeats' times, timing each solve, and once more under tracemalloc to
+    find its peak memory usage, the mean size of a node and the largest
+    frontier (see search.MemoryUsage). Returns the timings (in seconds) and the
+    statistics of the search."""
+    for _ in range(warmup):
+        solve(board, search)
+    times = []
+    for _ in range(repeats):
+        gc.collect()
+        start = time.perf_counter()
+        goal, problem = solve(board, search)
+        times.append(time.perf_counter() - start)
+
+    gc.collect()
+    memory = MemoryUsage(memory_interval, node_bytes)
+    memory.start()
+    solve(board, partial(search, hooks=memory))
+    memory.stop()
+
+    return {
+        'solved': goal is not None,
+        'repeats': repeats,
+        'times': times,
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if repeats > 1 else 0.0,
+        'min': min(times),
+        'max': max(times),
+        'succs': problem.succs,
+        'states': problem.states,
+        'peak_memory': memory.peak,
+        'bytes_per_node': memory.bytes_per_node(),
+        'max_frontier': memory.max_frontier,
+    }
+
+
+def run_benchmarks(instances: list, strategies, repeats: int = 10, warmup: int = 2,
+                   progress=None) -> list:
+    """Measures every strategy (names of STRATEGIES) on every (name, board)
+    instance. Returns a list of results, one per pair; 'progress', if given,
+    is called with each result as soon as it's measured."""
+    results = []
+    for strategy in strategies:
+        for name, board in instances:
+            result = {'instance': name, 'size': board.size, 'strategy': strategy}
+            result.update(measure(board, STRATEGIES[strategy], repeats, warmup))
+            results.append(result)
+            if progress:
+                progress(result)
+    return results
+
+
+def import_times(module: str) -> dict:
+    """Imports 'module' in a new interpreter with -X importtime. Returns the
+    cumulative import time (in seconds) of each module it imported."""
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                             cwd=os.path.dirname(os.path.abspath(__file__)),
+                             stderr=subprocess.PIPE, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if line.startswith('import time:'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():  # Not the header
+                times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+def measure_startup(module: str = 'takuzu', repeats: int = 10, warmup: int = 2,
+                    top: int = 10) -> dict:
+    """Measures the time it takes to import 'module' (without the start of
+    the interpreter), in a new interpreter each time. Returns the same fields
+    as measure, with 'startup' as the strategy, so that the import time is
+    stored in (and compared against) the baselines like any search, and the
+    'top' slowest imports of the last run."""
+    for _ in range(warmup):
+        import_times(module)
+    times = []
+    for _ in range(repeats):
+        imports = import_times(module)
+        times.append(imports[module])
+    return {
+        'instance': module,
+        'size': 0,
+        'strategy': 'startup',
+        'solved': True,
+        'repeats': repeats,
+        'times': times,
+        'median': statistics.median(times),
+        'mean': statistics.fmean(times),
+        'stdev': statistics.stdev(times) if repeats > 1 else 0.0,
+        'min': min(times),
+        'max': max(times),
+        'succs': 0,
+        'states': 0,
+        'peak_memory': 0,
+        'bytes_per_node': None,
+        'max_frontier': 0,
+        'imports': dict(sorted(imports.items(), key=lambda item: -item[1])[1:top + 1]),
+    }
+
+
+def write_json(results: list, path: str) -> None:
+    with open(path, 'w') as file:
+        json.dump(results, file, indent=2)
+
+
+def write_csv(results: list, path: str) -> None:
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def write_markdown(results: list, path: str) -> None:
+    """Writes the median times in the same format as the times.md file
+    generated by hyperfine.sh."""
+    with open(path, 'w') as file:
+        file.write("# Execution Times (ms)\n\n")
+        strategies = list(dict.fromkeys(result['strategy'] for result in results))
+        for strategy in strategies:
+            file.write("## {}\n".format(strategy))
+            for result in results:
+                if result['strategy'] == strategy:
+                    file.write("- Time: {} on {}: {:.3f} ms\n".format(
+                        strategy, result['instance'].lstrip('T'),
+                        result['median'] * 1000))
+            file.write("\n")
+
+
+def save_baseline(results: list, path: str, name: str) -> None:
+    """Stores 'results' (as returned by run_benchmarks) in the baselines
+    file 'path', under 'name', replacing any baseline with the same name."""
+    baselines = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            baselines = json.load(file)
+    baselines[name] = {
+        '{}/{}'.format(result['strategy'], result['instance']): {
+            field: result[field]
+            for field in ('times', 'median', 'succs', 'states', 'peak_memory')
+        }
+        for result in results
+    }
+    with open(path, 'w') as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+
+def load_baseline(path: str, name: str) -> dict:
+    with open(path) as file:
+        return json.load(file)[name]
+
+
+def bootstrap_ratio(baseline: list, current: list, confidence: float = 0.95,
+                    resamples: int = 2000, seed: int = 0) -> tuple:
+    """Returns a bootstrap confidence interval for the ratio between the
+    median of 'current' and the median of 'baseline' (two lists of times):
+    values above 1 mean that 'current' is slower."""
+    rng = random.Random(seed)
+    ratios = sorted(
+        statistics.median(rng.choices(current, k=len(current))) /
+        statistics.median(rng.choices(baseline, k=len(baseline)))
+        for _ in range(resamples)
+    )
+    tail = (1 - confidence) / 2
+    return ratios[int(tail * resamples)], ratios[int((1 - tail) * resamples) - 1]
+
+
+def compare(results: list, baseline: dict, threshold: float = 0.05,
+            confidence: float = 0.95) -> list:
+    """Compares every result of a run against the same (strategy, instance)
+    pair in 'baseline'. A change is only reported as a 'slowdown' (or a
+    'speedup') when the whole confidence interval of the ratio of the medians
+    lies more than 'threshold' above (or below) 1; node counts which changed
+    are always reported. Returns one dict per pair found in both."""
+    comparisons = []
+    for result in results:
+        key = '{}/{}'.format(result['strategy'], result['instance'])
+        if key not in baseline:
+            continue
+        base = baseline[key]
+        low, high = bootstrap_ratio(base['times'], result['times'], confidence)
+        verdict = 'unchanged'
+        if low > 1 + threshold:
+            verdict = 'slowdown'
+        elif high < 1 - threshold:
+            verdict = 'speedup'
+        comparisons.append({
+            'key': key,
+            'ratio': result['median'] / base['median'],
+            'interval': (low, high),
+            'verdict': verdict,
+            'nodes_changed': (result['succs'], result['states']) !=
+                             (base['succs'], base['states']),
+            'memory_ratio': result['peak_memory'] / base['peak_memory']
+                            if base['peak_memory'] else None,
+        })
+    return comparisons
+
+
+def print_comparison(comparison: dict) -> None:
+    low, high = comparison['interval']
+    print("{:<34} {:>6.3f}x  [{:.3f}, {:.3f}]  {}{}".format(
+        comparison['key'], comparison['ratio'], low, high,
+        comparison['verdict'], "  (node counts changed)"
+        if comparison['nodes_changed'] else ""))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmarks the search strategies on the test instances.")
+    parser.add_argument('--inputs', default=DEFAULT_INPUTS,
+                        help="glob pattern of the instances to benchmark")
+    parser.add_argument('--strategies', default=','.join(DEFAULT_STRATEGIES),
+                        help="comma separated list of strategies, or 'all'")
+    parser.add_argument('--repeats', type=int, default=10)
+    parser.add_argument('--warmup', type=int, default=2)
+    parser.add_argument('--startup', action='store_true',
+                        help="also measure the time it takes to import takuzu")
+    parser.add_argument('--json', metavar='FILE', help="write the results as JSON")
+    parser.add_argument('--csv', metavar='FILE', help="write the results as CSV")
+    parser.add_argument('--markdown', metavar='FILE',
+                        help="write the median times in the times.md format")
+    parser.add_argument('--baselines', default='baselines.json', metavar='FILE',
+                        help="file where the named baselines are stored")
+    parser.add_argument('--save-baseline', metavar='NAME',
+                        help="store this run as a baseline with the given name")
+    parser.add_argument('--compare', metavar='NAME',
+                        help="compare this run against the baseline with the given name")
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help="relative slowdown above which --compare fails")
+    parser.add_argument('--confidence', type=float, default=0.95,
+                        help="confidence level of the intervals of --compare")
+    args = parser.parse_args(argv)
+    if args.strategies == 'all':
+        args.strategies = list(STRATEGIES)
+    else:
+        args.strategies = args.strategies.split(',')
+    unknown = [name for name in args.strategies if name not in STRATEGIES]
+    if unknown:
+        parser.error("unknown strategies: " + ', '.join(unknown))
+    return args
+
+
+def print_result(result: dict) -> None:
+    print("{:<28} {:>5} {:>10.3f} ms  ±{:>8.3f}  {:>7} exp  {:>7} gen  {:>9} B".format(
+        result['strategy'], result['instance'], result['median'] * 1000,
+        result['stdev'] * 1000, result['succs'], result['states'],
+        result['peak_memory']))
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    instances = load_instances(args.inputs)
+    if not instances:
+        sys.exit("No instances match " + args.inputs)
+    results = run_benchmarks(instances, args.strategies, args.repeats,
+                             args.warmup, print_result)
+    if args.startup:
+        results.append(measure_startup('takuzu', args.repeats, args.warmup))
+        print_result(results[-1])
+    if args.json:
+        write_json(results, args.json)
+    if args.csv:
+        write_csv(results, args.csv)
+    if args.markdown:
+        write_markdown(results, args.markdown)
+    if args.save_baseline:
+        save_baseline(results, args.baselines, args.save_baseline)
+    if args.compare:
+        comparisons = compare(results, load_baseline(args.baselines, args.compare),
+                              args.threshold, args.confidence)
+        print()
+        for comparison in comparisons:
+            print_comparison(comparison)
+        if any(comparison['verdict'] == 'slowdown' for comparison in comparisons):
+            sys.exit(1)
@@ -0,0 +1,172 @@
+# cache.py: Cache de soluções de tabuleiros takuzu.
+# Tabuleiros que sejam rotações, reflexões ou complementos (0 <-> 1) uns dos
+# outros partilham a mesma entrada da cache, indexada pela sua forma canónica.
+
+import argparse
+import functools
+import json
+import os
+import sys
+import time
+from collections import OrderedDict
+from operator import itemgetter
+
+from takuzu import NO_SOLUTION, Board, solve
+
+MISSING = object()
+COMPLEMENT = str.maketrans('01', '10')
+
+
+@functools.lru_cache(maxsize=None)
+def symmetries(n: int) -> tuple:
+    """Returns the 8 symmetries of the square (the dihedral group) for boards
+    of size 'n', as pairs of functions (apply, invert) over flattened boards:
+    apply(cells)[i] is the cell which the symmetry moves into position i,
+    and invert undoes it."""
+    coords = [(row, col) for row in range(n) for col in range(n)]
+    maps = (
+        lambda r, c: (r, c),
+        lambda r, c: (n - 1 - c, r),
+        lambda r, c: (n - 1 - r, n - 1 - c),
+        lambda r, c: (c, n - 1 - r),
+        lambda r, c: (r, n - 1 - c),
+        lambda r, c: (n - 1 - r, c),
+        lambda r, c: (c, r),
+        lambda r, c: (n - 1 - c, n - 1 - r),
+    )
+    result = []
+    for source in maps:
+        permutation = [row * n + col for row, col in (source(r, c) for r, c in coords)]
+        inverse = [0] * len(permutation)
+        for i, j in enumerate(permutation):
+            inverse[j] = i
+        result.append((itemgetter(*permutation), itemgetter(*inverse)))
+    return tuple(result)
+
+
+def flatten(board: Board) -> str:
+    """Returns the cells of 'board', row by row, as a string of digits."""
+    return ''.join(str(cell) for row in board.board for cell in row)
+
+
+def canonicalize(board: Board) -> tuple:
+    """Returns the canonical form of 'board' (the smallest of its flattened
+    images under the 8 symmetries of the square, with and without swapping
+    0's and 1's), along with the index (in symmetries(n)) of the symmetry
+    which produces it and whether 0's and 1's were swapped."""
+    cells = flatten(board)
+    best = None
+    for index, (apply, _) in enumerate(symmetries(board.size)):
+        image = ''.join(apply(cells))
+        for complemented in (False, True):
+            if complemented:
+                image = image.translate(COMPLEMENT)
+            if best is None or image < best[0]:
+                best = (image, index, complemented)
+    return best
+
+
+class SolutionCache:
+    """A bounded LRU cache of solutions, indexed by canonical board: looking
+    up a board finds the solutions of all boards which are symmetric to it.
+    If 'path' is given, the cache is loaded from (and saved to) that file."""
+
+    def __init__(self, maxsize: int = 65536, path: str = None) -> None:
+        self.maxsize = maxsize
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = self.misses = 0
+        if path and os.path.exists(path):
+            self.load(path)
+
+    def get(self, board: Board, default=MISSING):
+        """Returns the solution of 'board' (None if it doesn't have one), or
+        'default' if it isn't cached."""
+        key, index, complemented = canonicalize(board)
+        key = (board.size, key)
+        if key not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        solution = self.entries[key]
+        if solution is None:
+            return None
+        _, invert = symmetries(board.size)[index]
+        cells = ''.join(invert(solution))
+        if complemented:
+            cells = cells.translate(COMPLEMENT)
+        n = board.size
+        return Board([list(map(int, cells[row * n:(row + 1) * n]))
+                      for row in range(n)], n)
+
+    def put(self, board: Board, solution) -> None:
+        """Caches 'solution' (a Board, or None if there's none) for 'board'."""
+        key, index, complemented = canonicalize(board)
+        if solution is not None:
+            apply, _ = symmetries(board.size)[index]
+            solution = ''.join(apply(flatten(solution)))
+            if complemented:
+                solution = solution.translate(COMPLEMENT)
+        self.entries[(board.size, key)] = solution
+        self.entries.move_to_end((board.size, key))
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def load(self, path: str) -> None:
+        with open(path) as file:
+            for size, key, solution in json.load(file):
+                self.entries[(size, key)] = solution
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def save(self, path: str = None) -> None:
+        """Writes the cache (least recently used entries first) to 'path', or
+        to the file it was loaded from."""
+        path = path or self.path
+        with open(path + '.tmp', 'w') as file:
+            json.dump([[size, key, solution]
+                       for (size, key), solution in self.entries.items()], file)
+        os.replace(path + '.tmp', path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def solve_cached(board: Board, cache: SolutionCache):
+    """Returns the solution of 'board' (None if it doesn't have one), looking
+    it up in 'cache' before searching for it."""
+    solution = cache.get(board)
+    if solution is MISSING:
+        goal, _ = solve(board)
+        solution = goal.state.board if goal else None
+        cache.put(board, solution)
+    return solution
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solves the takuzu boards read from the standard input, "
+                    "reusing the solutions of symmetric boards.")
+    parser.add_argument('--cache-file', default=None,
+                        help="file from which the cache is loaded, and to "
+                             "which it's saved at the end")
+    parser.add_argument('--maxsize', type=int, default=65536,
+                        help="maximum number of cached boards")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    cache = SolutionCache(args.maxsize, args.cache_file)
+    start = time.perf_counter()
+    for board in Board.parse_instances(sys.stdin):
+        solution = solve_cached(board, cache)
+        if solution:
+            print(str(solution) + "\n")
+        else:
+            print(NO_SOLUTION + "\n")
+    print("Hits: {}, misses: {} ({:.3f} s)".format(
+        cache.hits, cache.misses, time.perf_counter() - start), file=sys.stderr)
+    if args.cache_file:
+        cache.save()
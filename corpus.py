@@ -0,0 +1,177 @@
+# corpus.py: Formato binário compacto para coleções de tabuleiros takuzu.
+# Cada célula ocupa 2 bits (0, 1 ou 2 para uma célula vazia) e uma tabela de
+# offsets permite aceder a qualquer tabuleiro sem ler os anteriores; o
+# ficheiro é lido com mmap, pelo que só as páginas usadas são carregadas.
+# As tabelas ficam depois dos dados, para que o ficheiro seja escrito à medida
+# que os tabuleiros chegam (só o header é reescrito no fim).
+#
+# Formato (little-endian):
+#   header:  magic b'TKZC', version (u16), size (u16, 0 se variar), count (u32),
+#            tables (u64, a posição no ficheiro das tabelas)
+#   dados:   as células de cada tabuleiro, linha a linha, 4 por byte (a
+#            primeira nos bits altos)
+#   offsets: count + 1 offsets (u64), relativos ao início dos dados
+#   sizes:   se size == 0, o tamanho (u16) de cada tabuleiro
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+from itertools import chain
+
+from takuzu import Board
+
+MAGIC = b'TKZC'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIQ')
+OFFSET = struct.Struct('<Q')
+SIZE = struct.Struct('<H')
+
+# The 4 cells packed in each byte value
+UNPACKED = [((byte >> 6) & 3, (byte >> 4) & 3, (byte >> 2) & 3, byte & 3)
+            for byte in range(256)]
+
+
+def pack_board(board: Board) -> bytes:
+    """Packs the cells of 'board', 2 bits each."""
+    cells = list(chain.from_iterable(board.board))
+    cells += [0] * (-len(cells) % 4)
+    return bytes(a << 6 | b << 4 | c << 2 | d
+                 for a, b, c, d in zip(*[iter(cells)] * 4))
+
+
+def unpack_board(data, size: int) -> Board:
+    """Returns the Board with the cells packed (by pack_board) in 'data'.
+    Raises ValueError if they aren't the cells of a board of size 'size'."""
+    if len(data) != (size * size + 3) // 4:
+        raise ValueError("Expected the packed cells of a {0}x{0} board".format(size))
+    cells = list(chain.from_iterable(map(UNPACKED.__getitem__, data)))
+    if 3 in cells:
+        raise ValueError("Invalid packed cell")
+    return Board([cells[row * size:(row + 1) * size] for row in range(size)], size)
+
+
+def write_corpus(path: str, boards) -> int:
+    """Writes the boards of the iterable 'boards' to the corpus file 'path'.
+    Returns the number of boards written."""
+    return write_packed(path, ((board.size, pack_board(board)) for board in boards))
+
+
+def write_packed(path: str, entries) -> int:
+    """Writes a corpus file with the (size, packed cells) pairs of the
+    iterable 'entries' (packed with pack_board, e.g. in another process),
+    as they're produced: only their offsets and sizes are kept until the
+    end. Returns the number of boards written."""
+    offsets = array('Q', [0])
+    sizes = array('H')
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0))
+        for board_size, packed in entries:
+            file.write(packed)
+            offsets.append(offsets[-1] + len(packed))
+            sizes.append(board_size)
+        count = len(sizes)
+        size = sizes[0] if count and sizes.count(sizes[0]) == count else 0
+        tables = file.tell()
+        write_array(file, offsets)
+        if not size:
+            write_array(file, sizes)
+        file.seek(0)
+        file.write(HEADER.pack(MAGIC, VERSION, size, count, tables))
+    return count
+
+
+def write_array(file, values: array) -> None:
+    """Writes the 'values' to 'file', little-endian."""
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    values.tofile(file)
+
+
+class Corpus:
+    """A memory-mapped corpus file: a sequence of the boards in it, which are
+    only unpacked when they're accessed."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size or struct.unpack_from('<4sH', self.map) != (MAGIC, VERSION):
+            raise ValueError("{} isn't a version {} takuzu corpus".format(path, VERSION))
+        _, _, self.size, self.count, self.offsets = HEADER.unpack_from(self.map)
+        self.sizes = self.offsets + OFFSET.size * (self.count + 1)
+        self.data = HEADER.size
+        if self.sizes + (0 if self.size else SIZE.size * self.count) > len(self.map):
+            raise ValueError("{} is truncated".format(path))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> Board:
+        if not 0 <= index < self.count:
+            raise IndexError("corpus index out of range")
+        start, end = struct.unpack_from('<2Q', self.map, self.offsets + OFFSET.size * index)
+        start += self.data
+        end += self.data
+        if not start <= end <= self.offsets:
+            raise ValueError("Corrupt offsets of board {}".format(index))
+        size = self.size or SIZE.unpack_from(self.map, self.sizes + SIZE.size * index)[0]
+        with memoryview(self.map) as view:
+            return unpack_board(view[start:end], size)
+
+    def __iter__(self):
+        return self.boards()
+
+    def boards(self, errors: bool = False):
+        """Yields the boards of the corpus. A corrupt board raises ValueError,
+        unless 'errors' is True: the error is then yielded in its place."""
+        for index in range(self.count):
+            try:
+                board = self[index]
+            except ValueError as error:
+                if not errors:
+                    raise
+                board = error
+            yield board
+
+    def close(self) -> None:
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Converts takuzu boards in the text format (read from the "
+                    "given files, or the standard input) to a binary corpus, "
+                    "or prints the boards of a corpus in the text format.")
+    parser.add_argument('corpus', help="the corpus file")
+    parser.add_argument('inputs', nargs='*', help="text files with the boards to convert")
+    parser.add_argument('--dump', action='store_true',
+                        help="print the boards of the corpus instead")
+    return parser.parse_args(argv)
+
+
+def read_inputs(paths: list):
+    """Yields the boards in the text files 'paths' (or the standard input)."""
+    if not paths:
+        yield from Board.parse_instances(sys.stdin)
+    for path in paths:
+        with open(path) as file:
+            yield from Board.parse_instances(file)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.dump:
+        with Corpus(args.corpus) as corpus:
+            for board in corpus:
+                print("{}\n{}\n".format(board.size, board))
+    else:
+        count = write_corpus(args.corpus, read_inputs(args.inputs))
+        print("{} boards written to {}".format(count, args.corpus), file=sys.stderr)
@@ -0,0 +1,358 @@
+# database.py: Base de dados com todas as soluções dos tabuleiros pequenos.
+# Para n <= 8 é possível enumerar todos os tabuleiros completos válidos; cada
+# um é guardado como a sequência dos identificadores das suas linhas (cada
+# linha válida tem um identificador). O índice tem, para cada linha do
+# tabuleiro e cada linha válida, o conjunto (um bitset) dos tabuleiros que
+# têm essa linha nessa posição: os tabuleiros compatíveis com as pistas de um
+# problema obtêm-se com uniões e interseções desses bitsets, sem procura.
+#
+# Formato (little-endian), um ficheiro por tamanho:
+#   header: magic b'TKZD', version (u16), size (u16), lines (u32), grids (u32)
+#   linhas: as células de cada linha válida (lines x size bytes)
+#   grids:  os identificadores das linhas de cada tabuleiro (grids x size bytes)
+#   índice: alinhado a 8 bytes, size x lines bitsets de (grids + 63) // 64 u64
+
+import argparse
+import mmap
+import os
+import re
+import struct
+import sys
+import time
+
+import numpy as np
+
+from takuzu import NO_SOLUTION, Board, solve
+
+MAGIC = b'TKZD'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+WORD = np.dtype('<u8')
+EMPTY = Board.EMPTY_CELL
+
+# The sizes stored by default: 7x7 boards have 25.6 million solutions, which
+# would take an index of some 800 MB
+SIZES = (2, 3, 4, 5, 6, 8)
+# The largest size whose bitsets are also kept as Python ints (6x6 boards have
+# 4140 solutions): intersecting a few ints takes less than a single NumPy
+# call, while the bitsets of 8x8 boards are 4 million bits long
+INT_SIZE = 6
+
+
+def valid_lines(n: int):
+    """Returns the cells of all the lines of size 'n' which may be part of a
+    solution (without three equal adjacent cells, and with at most half,
+    rounded up, of each value), as a (lines x n) array, in lexicographic
+    order."""
+    cap = (n + 1) // 2
+    codes = np.arange(1 << n)
+    cells = ((codes[:, None] >> np.arange(n - 1, -1, -1)) & 1).astype(np.int8)
+    ones = cells.sum(axis=1)
+    valid = (ones <= cap) & (n - ones <= cap)
+    if n >= 3:
+        windows = cells[:, :-2] + cells[:, 1:-1] + cells[:, 2:]
+        valid &= ~((windows == 0) | (windows == 3)).any(axis=1)
+    return cells[valid]
+
+
+def enumerate_grids(n: int, chunk: int = 1 << 16) -> tuple:
+    """Returns all the solutions of size 'n', as a tuple (lines, grids):
+    the valid lines (see valid_lines) and the (grids x n) array with the
+    line of each row of each solution, in lexicographic order. The grids are
+    extended a row at a time, 'chunk' of them at once."""
+    lines = valid_lines(n)
+    cap = (n + 1) // 2
+    ids = np.arange(len(lines))
+    # Whether three lines may be stacked without three equal cells in a column
+    stacked = lines[:, None, None, :] + lines[None, :, None, :] + lines[None, None, :, :]
+    stackable = ~((stacked == 0) | (stacked == 3)).any(axis=-1)
+    grids = ids.astype(np.uint8)[:, None]
+    for row in range(1, n):
+        extended = []
+        for start in range(0, len(grids), chunk):
+            part = grids[start:start + chunk]
+            ones = lines[part].sum(axis=1)[:, None, :] + lines[None]
+            allowed = ((ones <= cap) & (row + 1 - ones <= cap)).all(axis=-1)
+            allowed &= (part[:, :, None] != ids).all(axis=1)
+            if row >= 2:
+                allowed &= stackable[part[:, -2], part[:, -1]]
+            grid, line = np.nonzero(allowed)
+            extended.append(np.concatenate((part[grid], line.astype(np.uint8)[:, None]), axis=1))
+        grids = np.concatenate(extended)
+    # Only the columns may still be equal
+    weights = 1 << np.arange(n, dtype=np.int64)
+    distinct = []
+    for start in range(0, len(grids), chunk):
+        columns = np.sort(lines[grids[start:start + chunk]].transpose(0, 2, 1) @ weights, axis=1)
+        distinct.append(~(columns[:, 1:] == columns[:, :-1]).any(axis=1))
+    return lines, grids[np.concatenate(distinct)] if distinct else grids
+
+
+def write_database(path: str, n: int) -> int:
+    """Writes the database of the solutions of size 'n' to 'path'. Returns
+    the number of solutions."""
+    lines, grids = enumerate_grids(n)
+    words = (len(grids) + 63) // 64
+    with open(path, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, n, len(lines), len(grids)))
+        file.write(lines.astype(np.uint8).tobytes())
+        file.write(grids.tobytes())
+        file.write(bytes(-file.tell() % WORD.itemsize))
+        bitset = np.zeros(words * 64, dtype=bool)
+        for row in range(n):
+            for line in range(len(lines)):
+                bitset[:len(grids)] = grids[:, row] == line
+                file.write(np.packbits(bitset, bitorder='little').tobytes())
+    return len(grids)
+
+
+def database_path(directory: str, size: int) -> str:
+    """The path of the database of the boards of size 'size' in 'directory'."""
+    return os.path.join(directory, "takuzu-{}.tkd".format(size))
+
+
+class SolutionDatabase:
+    """A memory-mapped database of all the solutions of a size, which finds
+    the solutions of a board by intersecting the bitsets of its rows."""
+
+    def __init__(self, path: str) -> None:
+        with open(path, 'rb') as file:
+            self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, size, lines, grids = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} isn't a version {} takuzu solution database".format(path, VERSION))
+        offset = HEADER.size
+        lines = np.frombuffer(self.map, np.uint8, lines * size, offset).reshape(lines, size)
+        offset += lines.nbytes
+        grids = np.frombuffer(self.map, np.uint8, grids * size, offset).reshape(grids, size)
+        offset += grids.nbytes
+        offset += -offset % WORD.itemsize
+        words = (len(grids) + 63) // 64
+        index = np.frombuffer(self.map, WORD, size * len(lines) * words, offset)
+        self.use_arrays(lines, grids, index.reshape(size, len(lines), words))
+
+    @classmethod
+    def from_arrays(cls, lines, grids, index):
+        """Returns the database with the given arrays (e.g. the ones of
+        another database, see arrays, shared with other processes)."""
+        database = cls.__new__(cls)
+        database.map = None
+        database.use_arrays(lines, grids, index)
+        return database
+
+    def use_arrays(self, lines, grids, index) -> None:
+        self.lines, self.grids, self.index = lines, grids, index
+        self.size = lines.shape[1]
+        self.count = len(grids)
+        self.words = index.shape[-1]
+        # The bits of the last word which stand for grids
+        self.last = np.array((1 << (self.count % 64 or 64)) - 1, dtype=WORD)
+        self.bitsets = None
+        if self.size <= INT_SIZE:
+            self.bitsets = [[int.from_bytes(words.tobytes(), 'little') for words in row]
+                            for row in index]
+            self.cells = lines.tolist()
+            # The union of the bitsets of the lines matching each (row,
+            # cells) pair looked up: at most 3^6 x 6 of them
+            self.unions = {}
+
+    def arrays(self) -> tuple:
+        """The (lines, grids, index) arrays of the database."""
+        return self.lines, self.grids, self.index
+
+    def matching_words(self, board: Board) -> tuple:
+        """Returns the words of the bitset of the solutions which have the
+        filled cells of 'board' which have any of them, as a tuple (indices,
+        words). The rows are intersected from the one matching the fewest
+        lines, and then only over the words which may still be nonzero."""
+        cells = np.array(board.board, dtype=np.int8)[:, None, :]
+        matches = ((self.lines == cells) | (cells == EMPTY)).all(axis=-1)
+        counts = matches.sum(axis=1)
+        live = result = None
+        for row in np.argsort(counts, kind='stable'):
+            count, ids = counts[row], matches[row]
+            if count == len(ids):
+                break
+            # Union of the fewest bitsets: those of the lines matching the
+            # row, or the complement of those of the lines which don't
+            complement = 2 * count > len(ids)
+            chosen = np.flatnonzero(ids != complement)
+            if live is None:
+                union = np.bitwise_or.reduce(self.index[row, chosen], axis=0)
+            else:
+                union = np.bitwise_or.reduce(self.index[row][np.ix_(chosen, live)], axis=0)
+            if complement:
+                union = ~union
+            result = union if result is None else result & union
+            nonzero = np.flatnonzero(result)
+            live, result = (nonzero if live is None else live[nonzero]), result[nonzero]
+            if not len(live):
+                break
+        if live is None:
+            live = np.arange(self.words)
+            result = np.full(self.words, ~np.uint64(0), dtype=WORD)
+        if len(live) and live[-1] == self.words - 1:
+            result[-1] &= self.last
+            if not result[-1]:
+                live, result = live[:-1], result[:-1]
+        return live, result
+
+    def matching_int(self, board: Board) -> int:
+        """Returns the bitset, as an int, of the solutions which have the
+        filled cells of 'board' (of a size up to INT_SIZE)."""
+        result = (1 << self.count) - 1
+        for row, cells in enumerate(board.board):
+            key = (row, bytes(cells))
+            union = self.unions.get(key)
+            if union is None:
+                union = 0
+                for line, bitset in zip(self.cells, self.bitsets[row]):
+                    if all(cell == EMPTY or cell == value for cell, value in zip(cells, line)):
+                        union |= bitset
+                self.unions[key] = union
+            result &= union
+            if not result:
+                break
+        return result
+
+    def matching(self, board: Board):
+        """Returns the bitset (an array of words) of the solutions which have
+        the filled cells of 'board'."""
+        bits = np.zeros(self.words, dtype=WORD)
+        live, words = self.matching_words(board)
+        bits[live] = words
+        return bits
+
+    def solutions(self, board: Board, limit: int = None) -> list:
+        """Returns the solutions of 'board' (up to 'limit' of them), as
+        Boards, in lexicographic order."""
+        if self.bitsets is not None:
+            bits = self.matching_int(board)
+            found = []
+            while bits and (limit is None or len(found) < limit):
+                low = bits & -bits
+                found.append(low.bit_length() - 1)
+                bits ^= low
+            return [Board([list(self.cells[line]) for line in self.grids[grid].tolist()], self.size)
+                    for grid in found]
+        live, words = self.matching_words(board)
+        live, words = live[:limit], words[:limit]
+        found = np.unpackbits(words.view(np.uint8), bitorder='little').reshape(-1, 64)
+        word, bit = np.nonzero(found)
+        return [Board(self.lines[self.grids[grid]].tolist(), self.size)
+                for grid in (live[word] * 64 + bit)[:limit]]
+
+    def solve(self, board: Board):
+        """Returns the first solution of 'board', or None if it has none."""
+        found = self.solutions(board, 1)
+        return found[0] if found else None
+
+    def is_unique(self, board: Board) -> bool:
+        """Whether 'board' has exactly one solution."""
+        return len(self.solutions(board, 2)) == 1
+
+    def close(self) -> None:
+        del self.lines, self.grids, self.index
+        if self.map is not None:
+            self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class DatabaseDirectory:
+    """The databases in a directory (see database_path), opened when the
+    first board of their size is looked up."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.databases = {}
+
+    def get(self, size: int):
+        """Returns the database of the boards of size 'size', or None if
+        there's none in the directory."""
+        if size not in self.databases:
+            path = database_path(self.directory, size)
+            self.databases[size] = SolutionDatabase(path) if os.path.exists(path) else None
+        return self.databases[size]
+
+    def close(self) -> None:
+        for database in self.databases.values():
+            if database is not None:
+                database.close()
+        self.databases.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def database_sizes(directory: str) -> list:
+    """The sizes of the databases in 'directory'."""
+    names = (re.fullmatch(r'takuzu-(\d+)\.tkd', name) for name in os.listdir(directory))
+    return sorted(int(match.group(1)) for match in names if match)
+
+
+def share_databases(directory: str, shared) -> dict:
+    """Copies the databases in 'directory' to shared memory (see
+    shared.SharedTables). Returns, for each size, the handles of their
+    arrays, to give to attach_databases in other processes."""
+    handles = {}
+    for size in database_sizes(directory):
+        with SolutionDatabase(database_path(directory, size)) as database:
+            handles[size] = tuple(map(shared.share, database.arrays()))
+    return handles
+
+
+def attach_databases(handles: dict) -> dict:
+    """Returns the databases shared by share_databases, for each size."""
+    from shared import attach
+    return {size: SolutionDatabase.from_arrays(*map(attach, arrays))
+            for size, arrays in handles.items()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solves the takuzu boards read from the standard input by "
+                    "looking them up in databases of all the solutions of "
+                    "their size (boards of other sizes are searched), or "
+                    "builds those databases.")
+    parser.add_argument('directory', help="the directory with the databases")
+    parser.add_argument('--build', action='store_true',
+                        help="build the databases instead")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help="the sizes of the databases to build (default: %(default)s)")
+    parser.add_argument('--unique', action='store_true',
+                        help="print whether each board has no, one or multiple solutions "
+                             "instead of solving it")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.build:
+        os.makedirs(args.directory, exist_ok=True)
+        for size in args.sizes:
+            start = time.perf_counter()
+            count = write_database(database_path(args.directory, size), size)
+            print("Size {}: {} solutions in {:.1f} s".format(
+                size, count, time.perf_counter() - start), file=sys.stderr)
+        sys.exit()
+    with DatabaseDirectory(args.directory) as databases:
+        for board in Board.parse_instances(sys.stdin):
+            database = databases.get(board.size)
+            if args.unique:
+                print(("none", "unique", "multiple")[len(database.solutions(board, 2))]
+                      if database is not None else "unknown")
+                continue
+            if database is not None:
+                solution = database.solve(board)
+            else:
+                goal, _ = solve(board)
+                solution = goal.state.board if goal else None
+            print((str(solution) if solution else NO_SOLUTION) + "\n")
@@ -0,0 +1,342 @@
+# distributed.py: Resolução em lote distribuída por várias máquinas.
+# Um coordenador lê os tabuleiros e serve-os, em lotes, por um socket TCP;
+# os trabalhadores (noutros processos, possivelmente noutras máquinas) pedem
+# lotes, resolvem-nos com o solver de takuzu.py e devolvem os resultados. Os
+# lotes de um trabalhador que se desliga (ou que não responde dentro do prazo)
+# voltam para a fila, e cada resultado é registado uma única vez, mesmo que
+# chegue repetido.
+#
+# Protocolo: uma mensagem JSON por linha, em ambos os sentidos.
+#   {"op": "get", "worker": nome}
+#       -> {"batch": id, "indices": [...], "boards": [texto, ...]}
+#       -> {"wait": segundos} (não há lotes livres, mas ainda há lotes em curso)
+#       -> {"done": true} (todos os tabuleiros estão resolvidos)
+#   {"op": "result", "worker": nome, "batch": id, "elapsed": segundos,
+#    "results": [[índice, resultado], ...]}
+#       -> {"recorded": número de resultados novos}
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from collections import Counter, deque
+
+from batch import report, solve_chunk
+from takuzu import Board
+
+# The longest message accepted, in bytes
+MESSAGE_LIMIT = 1 << 26
+
+
+def board_text(board: Board) -> str:
+    """The text of 'board', in the format read by Board.parse_instances."""
+    return "{}\n{}".format(board.size, board)
+
+
+def board_digest(board: Board) -> str:
+    """A digest of 'board', kept in the journal with its result."""
+    return hashlib.sha1(board_text(board).encode()).hexdigest()
+
+
+class Coordinator:
+    """Hands out the boards of 'boards' (a list) in batches of 'batch_size'
+    to the workers which connect to it, and records their results.
+
+    A batch is leased to one worker at a time. It goes back to the front of
+    the queue if that worker disconnects, or hasn't returned its results
+    'lease' seconds later; after 'max_attempts' leases, its boards are
+    recorded as errors. Results are recorded only once per board, so late or
+    repeated ones (e.g. from a worker whose lease expired) are ignored. If a
+    'journal' path is given, every result is appended to it (a JSON line per
+    board, with the board's digest), and the results already there are
+    loaded, so a coordinator restarted with the same boards only hands out
+    the missing ones. Entries whose index or digest doesn't match a board
+    (e.g. from another input) are ignored, and counted in 'stale'."""
+
+    def __init__(self, boards: list, batch_size: int = 16, lease: float = 60.0,
+                 max_attempts: int = 3, journal: str = None) -> None:
+        self.boards = boards
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.results = {}
+        self.stats = {}
+        self.stale = 0
+        self.digests = [board_digest(board) for board in boards] if journal is not None else None
+        if journal is not None and os.path.exists(journal):
+            with open(journal) as file:
+                for line in file:
+                    if line.strip():
+                        entry = json.loads(line)
+                        index = entry.get('index')
+                        if (isinstance(index, int) and 0 <= index < len(boards) and
+                                entry.get('board') == self.digests[index]):
+                            self.results.setdefault(index, entry['output'])
+                        else:
+                            self.stale += 1
+        self.journal = open(journal, 'a') if journal is not None else None
+        # The number of boards (all of them with an index in range) still
+        # without a result
+        self.missing = len(boards) - len(self.results)
+        self.batches = {}
+        for start in range(0, len(boards), batch_size):
+            indices = [index for index in range(start, min(start + batch_size, len(boards)))
+                       if index not in self.results]
+            if indices:
+                self.batches[start] = indices
+        self.pending = deque(self.batches)
+        self.leases = {}
+        self.attempts = Counter()
+        self.finished = asyncio.Event()
+        self.finished_at = None
+        if not self.batches:
+            self.finish(None)
+
+    def complete(self, batch: int) -> bool:
+        return all(index in self.results for index in self.batches[batch])
+
+    def record(self, index: int, output: str) -> bool:
+        """Records the result of a board, unless it already has one."""
+        if index in self.results:
+            return False
+        self.results[index] = output
+        self.missing -= 1
+        if self.journal is not None:
+            entry = {'index': index, 'board': self.digests[index], 'output': output}
+            self.journal.write(json.dumps(entry) + "\n")
+            self.journal.flush()
+        return True
+
+    def finish(self, batch: int) -> None:
+        """Forgets the lease of 'batch', which is complete."""
+        self.leases.pop(batch, None)
+        if not self.missing and not self.finished.is_set():
+            self.finished_at = time.perf_counter()
+            self.finished.set()
+
+    def expire(self) -> None:
+        """Puts the batches whose lease has expired back in the queue."""
+        now = time.monotonic()
+        for batch, (_, deadline) in list(self.leases.items()):
+            if deadline < now:
+                del self.leases[batch]
+                self.pending.appendleft(batch)
+
+    def release(self, owner) -> None:
+        """Puts the batches leased to 'owner' (a lost worker) back in the queue."""
+        for batch, (holder, _) in list(self.leases.items()):
+            if holder is owner:
+                del self.leases[batch]
+                self.pending.appendleft(batch)
+
+    def get(self, owner) -> dict:
+        """Leases the next batch to 'owner'. Returns the response to a get."""
+        self.expire()
+        while self.pending:
+            batch = self.pending.popleft()
+            if self.complete(batch) or batch in self.leases:
+                continue
+            if self.attempts[batch] >= self.max_attempts:
+                for index in self.batches[batch]:
+                    self.record(index, "error: batch lost {} times".format(self.attempts[batch]))
+                self.finish(batch)
+                continue
+            self.attempts[batch] += 1
+            self.leases[batch] = (owner, time.monotonic() + self.lease)
+            indices = [index for index in self.batches[batch] if index not in self.results]
+            return {'batch': batch, 'indices': indices,
+                    'boards': [board_text(self.boards[index]) for index in indices]}
+        if self.finished.is_set():
+            return {'done': True}
+        return {'wait': min(1.0, self.lease / 4)}
+
+    def put(self, message: dict) -> dict:
+        """Records the results of a batch. Returns the response to a result."""
+        batch = message['batch']
+        if batch not in self.batches:
+            return {'error': "unknown batch {}".format(batch)}
+        allowed = set(self.batches[batch])
+        recorded = sum(self.record(index, output) for index, output in message['results']
+                       if index in allowed)
+        solved, seconds = self.stats.get(message.get('worker'), (0, 0.0))
+        self.stats[message.get('worker')] = (solved + recorded, seconds + message.get('elapsed', 0.0))
+        if self.complete(batch):
+            self.finish(batch)
+        return {'recorded': recorded}
+
+    async def handle(self, reader, writer) -> None:
+        """Serves a worker's connection, a message at a time."""
+        owner = object()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    message = json.loads(line)
+                    if message['op'] == 'get':
+                        response = self.get(owner)
+                    elif message['op'] == 'result':
+                        response = self.put(message)
+                    else:
+                        response = {'error': "unknown op {}".format(message['op'])}
+                except (ValueError, KeyError, TypeError) as error:
+                    response = {'error': "malformed message: {!r}".format(error)}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            # Cancelled when the coordinator stops
+            pass
+        finally:
+            self.release(owner)
+            writer.close()
+
+    def outputs(self) -> list:
+        """The result of each board, in order."""
+        return [self.results[index] for index in range(len(self.boards))]
+
+    def close(self) -> None:
+        if self.journal is not None:
+            self.journal.close()
+
+
+async def coordinate(coordinator: Coordinator, host: str, port: int, linger: float = 2.0) -> bool:
+    """Serves 'coordinator' on 'host':'port' until every board has a result
+    (and then for 'linger' seconds more, so that waiting workers learn
+    they're done), or until SIGINT or SIGTERM. Returns whether it finished."""
+    server = await asyncio.start_server(coordinator.handle, host, port, limit=MESSAGE_LIMIT)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, asyncio.current_task().cancel)
+    try:
+        async with server:
+            await coordinator.finished.wait()
+            await asyncio.sleep(linger)
+    except asyncio.CancelledError:
+        return False
+    return True
+
+
+def call(stream, message: dict) -> dict:
+    """Sends 'message' through 'stream' and returns the response."""
+    stream.write(json.dumps(message) + "\n")
+    stream.flush()
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("connection closed by the coordinator")
+    return json.loads(line)
+
+
+def run_worker(host: str = 'localhost', port: int = 8766, retry: float = 10.0) -> int:
+    """Solves batches from the coordinator at 'host':'port' until it has none
+    left. Lost connections are retried for up to 'retry' seconds (also when
+    first connecting), and results not yet acknowledged are sent again.
+    Returns the number of boards solved."""
+    name = "{}:{}".format(socket.gethostname(), os.getpid())
+    unsent = None
+    solved = 0
+    while True:
+        deadline = time.monotonic() + retry
+        while True:
+            try:
+                connection = socket.create_connection((host, port))
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    return solved
+                time.sleep(0.1)
+        try:
+            with connection, connection.makefile('rw') as stream:
+                if unsent is not None:
+                    call(stream, unsent)
+                    unsent = None
+                while True:
+                    response = call(stream, {'op': 'get', 'worker': name})
+                    if response.get('done'):
+                        return solved
+                    if 'wait' in response:
+                        time.sleep(response['wait'])
+                        continue
+                    boards = Board.parse_instances('\n'.join(response['boards']).splitlines())
+                    _, elapsed, results = solve_chunk(list(zip(response['indices'], boards)))
+                    unsent = {'op': 'result', 'worker': name, 'batch': response['batch'],
+                              'elapsed': elapsed, 'results': results}
+                    call(stream, unsent)
+                    unsent = None
+                    solved += len(results)
+        except (OSError, ValueError):
+            continue
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solves the takuzu boards read from the standard input with "
+                    "workers connected through TCP (possibly from other hosts), "
+                    "or runs those workers.")
+    parser.add_argument('--worker', action='store_true',
+                        help="act as a worker of a running coordinator")
+    parser.add_argument('--host', default='localhost',
+                        help="address to listen on (or to connect to, as a worker)")
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes to run (as a worker)")
+    parser.add_argument('--retry', type=float, default=10.0,
+                        help="seconds a worker keeps trying to (re)connect")
+    parser.add_argument('--batch-size', type=int, default=16,
+                        help="number of boards handed out at a time")
+    parser.add_argument('--lease', type=float, default=60.0,
+                        help="seconds a worker has to return a batch before it's "
+                             "handed out again")
+    parser.add_argument('--max-attempts', type=int, default=3,
+                        help="number of times a batch is handed out before its "
+                             "boards are given up on")
+    parser.add_argument('--journal', metavar='FILE',
+                        help="append the results to FILE, and skip the boards "
+                             "already in it")
+    parser.add_argument('--corpus', metavar='FILE',
+                        help="read the boards from a binary corpus (see corpus.py) "
+                             "instead of the standard input")
+    parser.add_argument('--quiet', action='store_true',
+                        help="don't report the throughput of each worker")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.worker:
+        processes = [multiprocessing.Process(target=run_worker,
+                                             args=(args.host, args.port, args.retry))
+                     for _ in range(args.workers - 1)]
+        for process in processes:
+            process.start()
+        run_worker(args.host, args.port, args.retry)
+        for process in processes:
+            process.join()
+        sys.exit()
+    if args.corpus:
+        from corpus import Corpus
+        with Corpus(args.corpus) as corpus:
+            boards = list(corpus)
+    else:
+        boards = list(Board.parse_instances(sys.stdin))
+    start = time.perf_counter()
+    coordinator = Coordinator(boards, args.batch_size, args.lease, args.max_attempts, args.journal)
+    if coordinator.stale:
+        print("Ignored {} journal entries of other boards".format(coordinator.stale),
+              file=sys.stderr)
+    try:
+        finished = asyncio.run(coordinate(coordinator, args.host, args.port))
+    finally:
+        coordinator.close()
+    if not finished:
+        sys.exit("Interrupted with {} of {} boards solved".format(
+            len(coordinator.results), len(boards)))
+    for output in coordinator.outputs():
+        print(output + "\n")
+    if not args.quiet:
+        report(coordinator.stats, coordinator.finished_at - start)
@@ -0,0 +1,282 @@
+# generator.py: Geração de tabuleiros takuzu aleatórios com solução única.
+# Primeiro é gerado um tabuleiro completo válido, e depois são retiradas pistas
+# enquanto o tabuleiro continuar a ser resolúvel apenas por dedução (o que
+# garante que a sua solução é única).
+
+import argparse
+import os
+import random
+import sys
+from multiprocessing import Pool
+
+from takuzu import Board
+
+
+def _paired_solution(n: int, rng) -> list:
+    """Returns a valid filled board of (even) size 'n' built from a random
+    (n/2)x(n/2) matrix of bits: each bit b becomes the pair 'b, 1-b' in an
+    even row, and the odd row below it is its complement. Every row and
+    column is then balanced and has no 3 in a row; the matrix is redrawn
+    until all rows (and columns) are distinct."""
+    half = n // 2
+    while True:
+        bits = [[rng.getrandbits(1) for _ in range(half)] for _ in range(half)]
+        if all(len({tuple(line) for line in lines} |
+                   {tuple(1 - bit for bit in line) for line in lines}) == 2 * half
+               for lines in (bits, list(zip(*bits)))):
+            break
+    rows = []
+    for line in bits:
+        row = [value for bit in line for value in (bit, 1 - bit)]
+        rows.append(row)
+        rows.append([1 - value for value in row])
+    return rows
+
+
+def _triple_at(rows: list, row: int, col: int) -> bool:
+    """Checks whether cell (row, col) is part of 3 equal cells in a row."""
+    n = len(rows)
+    value = rows[row][col]
+    run = 1
+    for step in (-1, 1):
+        c = col + step
+        while 0 <= c < n and rows[row][c] == value and abs(c - col) < 3:
+            run += 1
+            c += step
+    if run >= 3:
+        return True
+    run = 1
+    for step in (-1, 1):
+        r = row + step
+        while 0 <= r < n and rows[r][col] == value and abs(r - row) < 3:
+            run += 1
+            r += step
+    return run >= 3
+
+
+def _shuffle(rows: list, rng, moves: int) -> None:
+    """Randomizes the valid board 'rows' in place, by trying 'moves' swaps
+    of the values on the corners of a random rectangle whose corners
+    alternate (0 1 / 1 0). Such swaps keep the amount of 0's and 1's of
+    every row and column; swaps which create 3 in a row or repeated rows or
+    columns are undone."""
+    n = len(rows)
+    row_bits = [sum(value << col for col, value in enumerate(row)) for row in rows]
+    col_bits = [sum(rows[row][col] << row for row in range(n)) for col in range(n)]
+    row_set, col_set = set(row_bits), set(col_bits)
+    for _ in range(moves):
+        r1, r2 = rng.sample(range(n), 2)
+        c1, c2 = rng.sample(range(n), 2)
+        value = rows[r1][c1]
+        if rows[r2][c2] != value or rows[r1][c2] == value or rows[r2][c1] == value:
+            continue
+        corners = ((r1, c1), (r1, c2), (r2, c1), (r2, c2))
+        for r, c in corners:
+            rows[r][c] = 1 - rows[r][c]
+        new_rows = (row_bits[r1] ^ (1 << c1 | 1 << c2), row_bits[r2] ^ (1 << c1 | 1 << c2))
+        new_cols = (col_bits[c1] ^ (1 << r1 | 1 << r2), col_bits[c2] ^ (1 << r1 | 1 << r2))
+        row_set -= {row_bits[r1], row_bits[r2]}
+        col_set -= {col_bits[c1], col_bits[c2]}
+        if (any(_triple_at(rows, r, c) for r, c in corners) or
+                new_rows[0] in row_set or new_rows[1] in row_set or
+                new_cols[0] in col_set or new_cols[1] in col_set):
+            for r, c in corners:
+                rows[r][c] = 1 - rows[r][c]
+        else:
+            row_bits[r1], row_bits[r2] = new_rows
+            col_bits[c1], col_bits[c2] = new_cols
+        row_set |= {row_bits[r1], row_bits[r2]}
+        col_set |= {col_bits[c1], col_bits[c2]}
+
+
+def random_solution(n: int, rng, mixing: int = 4) -> list:
+    """Returns a random valid, completely filled, board of size 'n' (n >= 4)
+    as a list of rows of 0's and 1's. Boards of odd size are cut from a board
+    of size n + 1 (dropping its last row and column keeps every line within
+    one of balance). The board is then shuffled with 'mixing' * n^2 moves."""
+    while True:
+        rows = _paired_solution(n + n % 2, rng)
+        rows = [row[:n] for row in rows[:n]]
+        if len(set(map(tuple, rows))) == n and len(set(zip(*rows))) == n:
+            break
+    _shuffle(rows, rng, mixing * n * n)
+    return rows
+
+
+# ______________________________________________________________________________
+# Removal of clues. Lines are handled as bitmasks: bit i of a row (column) mask
+# refers to column (row) i.
+
+
+def _line_deductions(known: int, solution: int, full: int, cap: int) -> int:
+    """Returns the mask of the unknown cells of a line which can be deduced
+    from its 'known' cells, whose values are given by 'solution': cells next
+    to (or between) two equal values, and every cell once a value has been
+    used 'cap' times. Since deductions are sound, the deduced values are the
+    ones in 'solution', so only which cells are deduced matters."""
+    ones = known & solution
+    zeros = known ^ ones
+    if ones.bit_count() == cap or zeros.bit_count() == cap:
+        return full & ~known
+    deduced = 0
+    for same in (ones, zeros):
+        deduced |= ((same << 1) & (same << 2)) | ((same >> 1) & (same >> 2)) | \
+                   ((same << 1) & (same >> 1))
+    return deduced & full & ~known
+
+
+def _deduces_everything(known_rows: list, solution_rows: list, solution_cols: list,
+                        cap: int) -> bool:
+    """Checks whether repeatedly applying _line_deductions to every row and
+    column, starting from the clues 'known_rows', fills the whole board."""
+    n = len(known_rows)
+    full = (1 << n) - 1
+    rows = known_rows[:]
+    cols = [sum(((rows[r] >> c) & 1) << r for r in range(n)) for c in range(n)]
+    pending = [(True, i) for i in range(n)] + [(False, i) for i in range(n)]
+    queued = set(pending)
+    while pending:
+        line = pending.pop()
+        queued.discard(line)
+        is_row, i = line
+        lines, other = (rows, cols) if is_row else (cols, rows)
+        solution = solution_rows[i] if is_row else solution_cols[i]
+        deduced = _line_deductions(lines[i], solution, full, cap)
+        while deduced:
+            lines[i] |= deduced
+            while deduced:
+                j = (deduced & -deduced).bit_length() - 1
+                deduced &= deduced - 1
+                other[j] |= 1 << i
+                if (not is_row, j) not in queued:
+                    queued.add((not is_row, j))
+                    pending.append((not is_row, j))
+            deduced = _line_deductions(lines[i], solution, full, cap)
+    return all(row == full for row in rows)
+
+
+def remove_clues(rows: list, rng, density: float = 0.0, exhaustive: bool = False) -> list:
+    """Returns a puzzle (a list of rows where removed clues are EMPTY_CELL)
+    whose only solution is the filled board 'rows', keeping about 'density'
+    of its cells as clues (or as few as possible). Clues are visited in a
+    random order and removed when the rest of the puzzle still deduces them,
+    which keeps the whole board deducible: a clue is removed if its row or
+    column deduces it, using the other clues of the line along with the
+    cells that the crossing lines deduce from their own clues. If
+    'exhaustive', the remaining clues are then checked by propagating the
+    whole puzzle, which removes more of them but is much slower."""
+    n = len(rows)
+    cap = (n + 1) // 2
+    full = (1 << n) - 1
+    target = round(density * n * n)
+    solution_rows = [sum(value << col for col, value in enumerate(row)) for row in rows]
+    solution_cols = [sum(rows[row][col] << row for row in range(n)) for col in range(n)]
+    known_rows, known_cols = [full] * n, [full] * n
+    deduced_rows, deduced_cols = [0] * n, [0] * n
+    clues = n * n
+
+    def deduces(known, solution, i, crossing, j):
+        """Whether a line deduces its cell i, from its 'known' cells and the
+        cell each crossing line deduces on it (bit j of 'crossing')."""
+        if (_line_deductions(known, solution, full, cap) >> i) & 1:
+            return True
+        helped = known
+        for k, deduced in enumerate(crossing):
+            helped |= ((deduced >> j) & 1) << k
+        return (_line_deductions(helped, solution, full, cap) >> i) & 1
+
+    cells = [(row, col) for row in range(n) for col in range(n)]
+    rng.shuffle(cells)
+    removed = True
+    while removed and clues > target:
+        removed = False
+        for row, col in cells:
+            if clues <= target:
+                break
+            if not (known_rows[row] >> col) & 1:
+                continue
+            known_row = known_rows[row] & ~(1 << col)
+            known_col = known_cols[col] & ~(1 << row)
+            if deduces(known_row, solution_rows[row], col, deduced_cols, row) or \
+                    deduces(known_col, solution_cols[col], row, deduced_rows, col):
+                known_rows[row], known_cols[col] = known_row, known_col
+                deduced_rows[row] = _line_deductions(known_row, solution_rows[row], full, cap)
+                deduced_cols[col] = _line_deductions(known_col, solution_cols[col], full, cap)
+                clues -= 1
+                removed = True
+
+    for row, col in cells if exhaustive else ():
+        if clues <= target:
+            break
+        if not (known_rows[row] >> col) & 1:
+            continue
+        known_rows[row] &= ~(1 << col)
+        if _deduces_everything(known_rows, solution_rows, solution_cols, cap):
+            known_cols[col] &= ~(1 << row)
+            clues -= 1
+        else:
+            known_rows[row] |= 1 << col
+
+    return [[rows[row][col] if (known_rows[row] >> col) & 1 else Board.EMPTY_CELL
+             for col in range(n)] for row in range(n)]
+
+
+def generate(n: int, seed=None, density: float = 0.0, exhaustive: bool = False) -> tuple:
+    """Returns a (puzzle, solution) pair of boards of size 'n', where the
+    puzzle has a unique solution and about 'density' of its cells filled
+    (see remove_clues)."""
+    rng = random.Random(seed)
+    solution = random_solution(n, rng)
+    return Board(remove_clues(solution, rng, density, exhaustive), n), Board(solution, n)
+
+
+def format_instance(board: Board) -> str:
+    """Returns 'board' in the format read by Board.parse_instance_from_stdin."""
+    return "{}\n{}\n".format(board.size, board)
+
+
+def _generate_indexed(args: tuple) -> tuple:
+    n, seed, density, exhaustive, index = args
+    return generate(n, "{}:{}:{}".format(seed, n, index), density, exhaustive)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Generates random takuzu boards with a unique solution.")
+    parser.add_argument('size', type=int, help="size of the boards (at least 4)")
+    parser.add_argument('--count', type=int, default=1, help="number of boards")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--density', type=float, default=0.0,
+                        help="fraction of the cells kept as clues (by default, "
+                             "as few as possible)")
+    parser.add_argument('--exhaustive', action='store_true',
+                        help="remove more clues, checking each one against "
+                             "the whole board (much slower on large boards)")
+    parser.add_argument('--out-dir', default=None,
+                        help="write each board to an input_* file (and its "
+                             "solution to the matching output_* file) in this "
+                             "directory, instead of writing them all to stdout")
+    parser.add_argument('--prefix', default='G',
+                        help="prefix of the names of the generated files")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of worker processes")
+    args = parser.parse_args(argv)
+    if args.size < 4:
+        parser.error("the size of the boards must be at least 4")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    jobs = [(args.size, args.seed, args.density, args.exhaustive, index) for index in range(args.count)]
+    width = len(str(args.count))
+    with Pool(args.workers) as pool:
+        for index, (puzzle, solution) in enumerate(pool.imap(_generate_indexed, jobs, 8)):
+            if args.out_dir is None:
+                sys.stdout.write(format_instance(puzzle))
+                continue
+            name = "{}{}".format(args.prefix, str(index + 1).zfill(width))
+            with open(os.path.join(args.out_dir, "input_" + name), 'w') as file:
+                file.write(format_instance(puzzle))
+            with open(os.path.join(args.out_dir, "output_" + name), 'w') as file:
+                file.write(str(solution) + "\n")
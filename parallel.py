@@ -0,0 +1,208 @@
+# parallel.py: Procura em paralelo da solução de um único tabuleiro takuzu.
+# A árvore de procura é dividida em sub-árvores independentes, exploradas por
+# vários processos, que partilham trabalho entre si quando algum fica parado.
+
+import argparse
+import multiprocessing
+import os
+import queue
+from math import ceil, log2
+
+from search import InstrumentedProblem, Node, SearchHooks, depth_first_tree_search
+from takuzu import NO_SOLUTION, Board, Takuzu
+
+TASK_TIMEOUT = 0.01
+# Seconds between the checks that the workers are still alive
+POLL_INTERVAL = 0.1
+
+
+def split_search_tree(problem, levels: int) -> tuple:
+    """Expands the search tree of 'problem' (depth first) until 'levels'
+    decisions have been taken: nodes with a single successor (forced actions)
+    are followed without counting as a decision. Returns the goal node, if it
+    was found while splitting, and the list of nodes where each subtree
+    starts, in the order in which depth_first_tree_search would visit them."""
+    frontier = [(Node(problem.initial), 0)]
+    subtrees = []
+    while frontier:
+        node, decisions = frontier.pop()
+        if problem.goal_test(node.state):
+            return node, []
+        if decisions == levels:
+            subtrees.append(node)
+            continue
+        children = node.expand(problem)
+        decisions += len(children) > 1
+        frontier.extend((child, decisions) for child in children)
+    return None, subtrees
+
+
+class SearchCancelled(Exception):
+    """Raised (by a Donor) to abort the search of a worker once another one
+    found a goal."""
+
+
+class Donor(SearchHooks):
+    """Watches the frontier of a worker's search: every 'check_every'
+    expansions it aborts the search if 'cancel' is set, and otherwise answers
+    each request of the workers waiting for work ('idle' counts them) with
+    the shallowest node of the frontier (the root of its largest unexplored
+    subtree), so idle workers get about one node each."""
+
+    def __init__(self, tasks, outstanding, idle, cancel, check_every):
+        self.tasks = tasks
+        self.outstanding = outstanding
+        self.idle = idle
+        self.cancel = cancel
+        self.check_every = check_every
+        self.frontier = []
+        self.calls = 0
+
+    def on_frontier_size(self, size):
+        self.calls += 1
+        if self.calls % self.check_every:
+            return
+        if self.cancel.is_set():
+            raise SearchCancelled
+        while self.idle.value > 0 and len(self.frontier) > 1:
+            with self.idle.get_lock():
+                if self.idle.value == 0:
+                    break
+                self.idle.value -= 1
+            with self.outstanding.get_lock():
+                self.outstanding.value += 1
+            self.tasks.put(self.frontier.pop(0).state)
+
+
+def _worker(problem, tasks, results, outstanding, idle, cancel, check_every):
+    """Body of each worker process. Takes states from 'tasks' and explores the
+    subtree under each one with depth_first_tree_search, until some worker
+    finds a goal ('cancel' is set) or no outstanding subtrees are left; a
+    Donor shares the nodes of its frontier with the idle workers."""
+    tasks.cancel_join_thread()
+    problem = InstrumentedProblem(problem)
+    donor = Donor(tasks, outstanding, idle, cancel, check_every)
+    waiting = False
+    while not cancel.is_set() and outstanding.value > 0:
+        try:
+            state = tasks.get(timeout=TASK_TIMEOUT)
+        except queue.Empty:
+            # Ask for a node, or ask again if every request was answered (by
+            # a node some other worker took) and this one still has nothing
+            with idle.get_lock():
+                if not waiting or idle.value == 0:
+                    idle.value += 1
+            waiting = True
+            continue
+        waiting = False
+
+        donor.frontier = [Node(state)]
+        try:
+            goal = depth_first_tree_search(problem, donor, frontier=donor.frontier)
+        except SearchCancelled:
+            goal = None
+        if goal:
+            results.put(('goal', goal.state))
+            cancel.set()
+
+        with outstanding.get_lock():
+            outstanding.value -= 1
+    results.put(('stats', problem.succs, problem.states))
+
+
+def parallel_depth_first_search(problem, workers: int = None, levels: int = None,
+                                check_every: int = 64, stats=None):
+    """Depth first tree search of 'problem' spread over 'workers' processes.
+
+    The first 'levels' decision levels of the tree are expanded up front (by
+    default, enough of them to have about four subtrees per worker) and the
+    resulting subtrees are explored concurrently; idle workers receive work
+    from busy ones, and every worker stops as soon as one of them finds a
+    goal. Returns a Node holding the goal state (its path isn't kept across
+    processes), or None. If 'stats' is a dict, it's filled with the number of
+    nodes expanded ('succs') and generated ('states') by all processes. If a
+    worker fails (exits without finishing), the others are terminated and
+    RuntimeError is raised."""
+    workers = workers or os.cpu_count() or 1
+    if levels is None:
+        levels = ceil(log2(4 * workers))
+    splitter = InstrumentedProblem(problem)
+    goal, subtrees = split_search_tree(splitter, levels)
+    if stats is not None:
+        stats['succs'], stats['states'] = splitter.succs, splitter.states
+    if goal or not subtrees:
+        return goal
+
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    outstanding = multiprocessing.Value('i', len(subtrees))
+    idle = multiprocessing.Value('i', 0)
+    cancel = multiprocessing.Event()
+    for node in subtrees:
+        tasks.put(node.state)
+
+    args = (problem, tasks, results, outstanding, idle, cancel, check_every)
+    processes = [multiprocessing.Process(target=_worker, args=args, daemon=True)
+                 for _ in range(workers)]
+    for process in processes:
+        process.start()
+
+    goal = None
+    succs, states = splitter.succs, splitter.states
+    finished = 0
+    try:
+        while finished < len(processes):
+            try:
+                message = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                # A worker which finishes sends its statistics before exiting
+                for process in processes:
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError("A search worker exited with code {}".format(
+                            process.exitcode))
+                continue
+            if message[0] == 'goal':
+                goal = goal or Node(message[1])
+                continue
+            finished += 1
+            succs += message[1]
+            states += message[2]
+    except BaseException:
+        cancel.set()
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+
+    if stats is not None:
+        stats['succs'], stats['states'] = succs, states
+    return goal
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solves the takuzu board read from the standard input, "
+                    "exploring its search tree in parallel.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: one per core)")
+    parser.add_argument('--levels', type=int, default=None,
+                        help="number of decision levels expanded before "
+                             "splitting the search tree")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    board = Board.parse_instance_from_stdin()
+    stats = {}
+    goal = parallel_depth_first_search(Takuzu(board), args.workers, args.levels,
+                                       stats=stats)
+    if goal:
+        print(goal.state.board)
+    else:
+        print(NO_SOLUTION)
+
+    print("Gerados: " + str(stats.get('states', 0)))
+    print("Expandidos: " + str(stats.get('succs', 0)))
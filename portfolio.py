@@ -0,0 +1,194 @@
+# portfolio.py: Resolução de um tabuleiro takuzu por várias estratégias de
+# procura em simultâneo, cada uma no seu processo: a primeira a terminar ganha
+# e as restantes são interrompidas.
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the statistics file is still replaced atomically, but not locked
+    fcntl = None
+
+from search import (
+    astar_search,
+    breadth_first_graph_search,
+    breadth_first_tree_search,
+    depth_first_graph_search,
+    depth_first_tree_search,
+    greedy_search,
+    recursive_best_first_search,
+    uniform_cost_search,
+)
+from takuzu import NO_SOLUTION, Board, solve
+
+STRATEGIES = {
+    search.__name__: search
+    for search in (
+        depth_first_tree_search,
+        depth_first_graph_search,
+        breadth_first_tree_search,
+        breadth_first_graph_search,
+        uniform_cost_search,
+        greedy_search,
+        astar_search,
+        recursive_best_first_search,
+    )
+}
+DEFAULT_PORTFOLIO = ('depth_first_tree_search', 'greedy_search', 'astar_search')
+# The strategies which, when they don't find a solution, show that there's
+# none: all of them, since the tree of a board is finite, but one without
+# this guarantee (such as a depth-limited search) would not end the race
+COMPLETE = frozenset(STRATEGIES)
+# Seconds between the checks that the strategies' processes are still alive
+POLL_INTERVAL = 0.1
+
+
+def _run_strategy(name: str, board: Board, results) -> None:
+    """Body of each strategy's process: solves 'board' and reports the
+    solution (None if there's none) along with the search statistics, or the
+    error it raised."""
+    start = time.perf_counter()
+    try:
+        goal, problem = solve(board, STRATEGIES[name])
+    except Exception as error:
+        results.put((name, None, time.perf_counter() - start, 0, 0, repr(error)))
+        return
+    solution = goal.state.board if goal else None
+    results.put((name, solution, time.perf_counter() - start,
+                 problem.succs, problem.states, None))
+
+
+def solve_portfolio(board: Board, strategies=DEFAULT_PORTFOLIO, timeout: float = None) -> dict:
+    """Races every strategy in 'strategies' (names of STRATEGIES) on 'board',
+    each one in its own process, and terminates the others as soon as one of
+    them finds a solution, or shows that there's none (see COMPLETE).
+    Returns a dict with the 'winner' (None if no strategy did so within
+    'timeout' seconds), its 'solution' board (None if 'board' doesn't have
+    one), the 'time' it took, the number of nodes it expanded ('succs') and
+    generated ('states'), and the 'errors' of the strategies which failed
+    (raising an exception, or with their process ending without an answer),
+    for each one of them."""
+    results = multiprocessing.Queue()
+    processes = {
+        name: multiprocessing.Process(target=_run_strategy, args=(name, board, results),
+                                      daemon=True)
+        for name in strategies
+    }
+    for process in processes.values():
+        process.start()
+    deadline = None if timeout is None else time.monotonic() + timeout
+    running = set(processes)
+    # The strategies whose process had already ended at the last check: they
+    # failed if their answer still isn't in the queue at the next one
+    ended = set()
+    errors = {}
+    winner = None
+    try:
+        while running and winner is None:
+            wait = POLL_INTERVAL
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    break
+            try:
+                name, solution, elapsed, succs, states, error = results.get(timeout=wait)
+            except queue.Empty:
+                for name in ended & running:
+                    running.discard(name)
+                    errors[name] = "exited with code {}".format(processes[name].exitcode)
+                ended = {name for name in running if processes[name].exitcode is not None}
+                continue
+            running.discard(name)
+            if error is not None:
+                errors[name] = error
+            elif solution is not None or name in COMPLETE:
+                winner = name
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            process.join()
+    if winner is None:
+        solution = elapsed = None
+        succs = states = 0
+    return {'winner': winner, 'solution': solution, 'time': elapsed,
+            'succs': succs, 'states': states, 'errors': errors}
+
+
+def record_result(path: str, strategies, result: dict) -> dict:
+    """Adds the outcome of a race to the win statistics stored (as JSON) in
+    'path': for each strategy, the number of races it ran in, the number of
+    them it won, and the total time it took to win them. Returns the updated
+    statistics. The file 'path'.lock is locked while the statistics are read
+    and rewritten, and they're written aside and renamed, so concurrent
+    races neither lose updates nor leave a partial file behind."""
+    with open(path + '.lock', 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        stats = {}
+        if os.path.exists(path):
+            with open(path) as file:
+                stats = json.load(file)
+        for name in strategies:
+            entry = stats.setdefault(name, {'runs': 0, 'wins': 0, 'win_time': 0.0})
+            entry['runs'] += 1
+            if name == result['winner']:
+                entry['wins'] += 1
+                entry['win_time'] += result['time']
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary, 'w') as file:
+            json.dump(stats, file, indent=2, sort_keys=True)
+        os.replace(temporary, path)
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solves the takuzu board read from the standard input by "
+                    "racing several search strategies against each other.")
+    parser.add_argument('--strategies', default=','.join(DEFAULT_PORTFOLIO),
+                        help="comma separated list of strategies, out of: "
+                             + ', '.join(STRATEGIES))
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="seconds to wait for a strategy to finish")
+    parser.add_argument('--stats', default=None, metavar='FILE',
+                        help="JSON file where the win statistics are recorded")
+    args = parser.parse_args(argv)
+    args.strategies = args.strategies.split(',')
+    unknown = [name for name in args.strategies if name not in STRATEGIES]
+    if unknown:
+        parser.error("unknown strategies: " + ', '.join(unknown))
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    board = Board.parse_instance_from_stdin()
+    result = solve_portfolio(board, args.strategies, args.timeout)
+    if args.stats:
+        record_result(args.stats, args.strategies, result)
+
+    for name, error in result['errors'].items():
+        print("Strategy {} failed: {}".format(name, error), file=sys.stderr)
+    if result['winner'] is None:
+        if len(result['errors']) == len(args.strategies):
+            print('Every strategy failed.')
+        else:
+            print('No strategy finished within the time limit.')
+        sys.exit(1)
+    if result['solution']:
+        print(result['solution'])
+    else:
+        print(NO_SOLUTION)
+
+    print("Gerados: " + str(result['states']))
+    print("Expandidos: " + str(result['succs']))
+    print("Winner: {} ({:.3f} s)".format(result['winner'], result['time']),
+          file=sys.stderr)
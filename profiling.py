@@ -0,0 +1,119 @@
+# profiling.py: Perfilagem da fase de resolução.
+# Escreve um ficheiro pstats (com cProfile) e as pilhas de chamadas no formato
+# "folded" (uma pilha por linha, separada por ';', seguida do seu peso), que é
+# lido por ferramentas de flame graphs como flamegraph.pl ou speedscope.
+
+import cProfile
+import os
+import pstats
+import signal
+from collections import Counter
+
+MODES = ('cprofile', 'sample')
+
+
+def frame_name(filename: str, line: int, function: str) -> str:
+    """The name of a function in a folded stack."""
+    return "{} ({}:{})".format(function, os.path.basename(filename), line)
+
+
+class Profiler:
+    """Profiles the code run between start and stop (which may be called
+    several times, to profile only some phases of a program).
+
+    In 'cprofile' mode every call is traced with cProfile; the folded stacks
+    are then rebuilt from its caller/callee graph, splitting the time of each
+    function among its callers in proportion to the time spent in each call
+    site. In 'sample' mode the stack is sampled every 'interval' seconds of
+    CPU time (with SIGPROF, so only in the main thread, on Unix), which gives
+    exact stacks at a much lower overhead, but no pstats."""
+
+    def __init__(self, mode: str = 'cprofile', interval: float = 0.001) -> None:
+        if mode not in MODES:
+            raise ValueError("Unknown profiling mode: {}".format(mode))
+        self.mode = mode
+        self.interval = interval
+        self.profile = cProfile.Profile() if mode == 'cprofile' else None
+        self.samples = Counter()
+
+    def start(self) -> None:
+        if self.profile is not None:
+            self.profile.enable()
+        else:
+            signal.signal(signal.SIGPROF, self.sample)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+    def stop(self) -> None:
+        if self.profile is not None:
+            self.profile.disable()
+        else:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, signal.SIG_DFL)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def sample(self, signum, frame) -> None:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(frame_name(code.co_filename, code.co_firstlineno, code.co_name))
+            frame = frame.f_back
+        self.samples[';'.join(reversed(stack))] += 1
+
+    def folded(self) -> Counter:
+        """Returns the weight of each folded stack: its number of samples, or
+        the microseconds spent in it in 'cprofile' mode."""
+        if self.profile is None:
+            return self.samples
+        return folded_from_stats(pstats.Stats(self.profile).stats)
+
+    def write(self, prefix: str) -> list:
+        """Writes 'prefix.folded' and, in 'cprofile' mode, 'prefix.pstats'.
+        Returns the paths of the files written."""
+        paths = []
+        if self.profile is not None:
+            paths.append(prefix + '.pstats')
+            self.profile.dump_stats(paths[-1])
+        paths.append(prefix + '.folded')
+        with open(paths[-1], 'w') as file:
+            for stack, weight in sorted(self.folded().items()):
+                file.write("{} {}\n".format(stack, weight))
+        return paths
+
+
+def folded_from_stats(stats: dict, min_time: float = 1e-6) -> Counter:
+    """Rebuilds the folded stacks (weighted in microseconds) from the stats
+    of a pstats.Stats. Paths carrying less than 'min_time' seconds are
+    dropped, and recursive calls are folded into their first occurrence."""
+    callees = {}
+    roots = []
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller, (_, _, _, cumtime) in callers.items():
+            callees.setdefault(caller, []).append((function, cumtime))
+        # The profiler's own stop is the only caller-less call of this file.
+        if not callers and function[0] != __file__:
+            roots.append(function)
+
+    folded = Counter()
+
+    def walk(function, time, path):
+        _, _, tottime, cumtime, _ = stats[function]
+        path = path + [frame_name(*function)]
+        if cumtime <= 0:
+            return
+        own = time * tottime / cumtime
+        if own * 1e6 >= 1:
+            folded[';'.join(path)] += int(own * 1e6)
+        for callee, edge in callees.get(function, ()):
+            share = time * edge / cumtime
+            if share >= min_time and frame_name(*callee) not in path:
+                walk(callee, share, path)
+
+    for root in roots:
+        walk(root, stats[root][3], [])
+    return folded
@@ -6,10 +6,34 @@ then create problem instances and solve them with calls to the various search
 functions.
 """
 
+import bisect
+import os
+import random
 import sys
-from collections import deque
-
-from utils import *
+from collections import Counter, deque
+from time import perf_counter
+
+from utils import (
+    LazyModule,
+    PriorityQueue,
+    argmax_random_tie,
+    distance,
+    is_in,
+    memoize,
+    name,
+    np,
+    open_data,
+    print_table,
+    probability,
+    vector_add,
+    weighted_sampler,
+)
+
+# Only needed by SearchTrace, Checkpoint and MemoryUsage
+json = LazyModule('json')
+pickle = LazyModule('pickle')
+signal = LazyModule('signal')
+tracemalloc = LazyModule('tracemalloc')
 
 
 class Problem:
@@ -61,6 +85,16 @@ class Problem:
         and related algorithms try to maximize this value."""
         raise NotImplementedError
 
+    def encode_state(self, state):
+        """Return a picklable (and preferably compact) representation of the
+        state, to be stored in a Checkpoint; decode_state must undo it. The
+        default is the state itself."""
+        return state
+
+    def decode_state(self, data):
+        """Return the state encoded (by encode_state) in data."""
+        return data
+
 
 # ______________________________________________________________________________
 
@@ -130,6 +164,421 @@ class Node:
         return hash(self.state)
 
 
+# ______________________________________________________________________________
+# Search hooks
+
+
+class SearchHooks:
+    """Observes a search: the search functions call these methods (when given
+    hooks) as nodes are expanded, generated, discarded (pruned) and found to
+    be a goal, and whenever the size of their frontier changes. Subclass it
+    and override the methods you need."""
+
+    def on_expand(self, node):
+        pass
+
+    def on_generate(self, node):
+        pass
+
+    def on_goal(self, node):
+        pass
+
+    def on_prune(self, node):
+        pass
+
+    def on_frontier_size(self, size):
+        pass
+
+
+class HookList(SearchHooks):
+    """Forwards every event to each hook in a list of hooks."""
+
+    def __init__(self, *hooks):
+        self.hooks = hooks
+
+    def on_expand(self, node):
+        for hook in self.hooks:
+            hook.on_expand(node)
+
+    def on_generate(self, node):
+        for hook in self.hooks:
+            hook.on_generate(node)
+
+    def on_goal(self, node):
+        for hook in self.hooks:
+            hook.on_goal(node)
+
+    def on_prune(self, node):
+        for hook in self.hooks:
+            hook.on_prune(node)
+
+    def on_frontier_size(self, size):
+        for hook in self.hooks:
+            hook.on_frontier_size(size)
+
+
+class FrontierHighWater(SearchHooks):
+    """Keeps the largest size reached by the frontier."""
+
+    def __init__(self):
+        self.max_size = 0
+
+    def on_frontier_size(self, size):
+        if size > self.max_size:
+            self.max_size = size
+
+
+class DepthHistogram(SearchHooks):
+    """Counts the nodes expanded at each depth."""
+
+    def __init__(self):
+        self.expanded = Counter()
+
+    def on_expand(self, node):
+        self.expanded[node.depth] += 1
+
+
+class BranchingFactor(SearchHooks):
+    """Keeps the number of nodes expanded at each depth and of nodes generated
+    from them, whose ratio is the effective branching factor at that depth."""
+
+    def __init__(self):
+        self.expanded = Counter()
+        self.generated = Counter()
+
+    def on_expand(self, node):
+        self.expanded[node.depth] += 1
+
+    def on_generate(self, node):
+        self.generated[node.depth - 1] += 1
+
+    def factors(self):
+        """Returns {depth: effective branching factor}."""
+        return {depth: self.generated[depth] / count
+                for depth, count in sorted(self.expanded.items())}
+
+
+class MemoryUsage(SearchHooks):
+    """Measures the memory used by a search with tracemalloc: call start
+    before the search and stop after it. Every 'interval' expansions it keeps
+    a sample (starting with the first one) with the number of nodes expanded
+    before it, the frontier size and the memory traced (relative to the
+    memory traced on start); if node_size is given, it's also called on the
+    expanded node, to estimate the memory taken by each node. peak is the
+    largest memory traced during the search."""
+
+    def __init__(self, interval=100, node_size=None):
+        self.interval = interval
+        self.node_size = node_size
+        self.expanded = 0
+        self.frontier_size = self.max_frontier = 1
+        self.samples = []
+        self.node_sizes = []
+        self.peak = 0
+        self.base = 0
+        self.tracing = False
+
+    def start(self):
+        self.tracing = not tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        self.base = tracemalloc.get_traced_memory()[0]
+
+    def stop(self):
+        self.peak = tracemalloc.get_traced_memory()[1] - self.base
+        if self.tracing:
+            tracemalloc.stop()
+
+    def on_expand(self, node):
+        if self.expanded % self.interval == 0:
+            current = tracemalloc.get_traced_memory()[0] - self.base
+            self.samples.append((self.expanded, self.frontier_size, current))
+            if self.node_size is not None:
+                self.node_sizes.append(self.node_size(node))
+        self.expanded += 1
+
+    def on_frontier_size(self, size):
+        self.frontier_size = size
+        if size > self.max_frontier:
+            self.max_frontier = size
+
+    def bytes_per_node(self):
+        """The mean size of the sampled nodes (None if there's no sample)."""
+        if not self.node_sizes:
+            return None
+        return sum(self.node_sizes) / len(self.node_sizes)
+
+    def summary(self):
+        return {
+            'peak': self.peak,
+            'bytes_per_node': self.bytes_per_node(),
+            'max_frontier': self.max_frontier,
+            'samples': [{'expanded': expanded, 'frontier': frontier, 'memory': memory}
+                        for expanded, frontier, memory in self.samples],
+        }
+
+
+class SearchTrace(SearchHooks):
+    """Writes the events of a search to file as JSON lines. Every node gets an
+    id (the root is 0), and each event records the node's id, its parent's
+    id, depth, action, whether it was forced (its parent had no other child),
+    its h and f values (when h is given) and the time since the trace began.
+    Only a fraction sample_rate of the events is kept (goals always are), and
+    lines are written in batches of buffer_size. Call close when done."""
+
+    def __init__(self, file, sample_rate=1.0, buffer_size=1000, h=None, seed=None):
+        self.file = file
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self.h = h
+        self.random = random.Random(seed)
+        self.buffer = []
+        self.children = []  # The generated children of the last expanded node
+        self.next_id = 0
+        self.started = perf_counter()
+
+    def on_expand(self, node):
+        self.flush_children()
+        self.record('expand', node)
+
+    def on_generate(self, node):
+        node.trace_id = self.next_id
+        self.next_id += 1
+        self.children.append(node)
+
+    def on_goal(self, node):
+        self.flush_children()
+        self.record('goal', node, always=True)
+
+    def on_prune(self, node):
+        self.flush_children()
+        self.record('prune', node)
+
+    def on_frontier_size(self, size):
+        self.flush_children()
+        if self.random.random() < self.sample_rate:
+            self.write({'event': 'frontier', 'size': size, 't': perf_counter() - self.started})
+
+    def flush_children(self):
+        forced = len(self.children) == 1
+        for child in self.children:
+            child.trace_forced = forced
+            self.record('generate', child)
+        self.children = []
+
+    def node_id(self, node):
+        if not hasattr(node, 'trace_id'):
+            node.trace_id = self.next_id
+            self.next_id += 1
+        return node.trace_id
+
+    def record(self, event, node, always=False):
+        if not always and self.random.random() >= self.sample_rate:
+            return
+        entry = {
+            'event': event,
+            'id': self.node_id(node),
+            'parent': self.node_id(node.parent) if node.parent else None,
+            'depth': node.depth,
+            'action': node.action,
+            'forced': getattr(node, 'trace_forced', False),
+        }
+        if self.h is not None:
+            entry['h'] = self.h(node)
+            entry['f'] = getattr(node, 'f', node.path_cost + entry['h'])
+        entry['t'] = perf_counter() - self.started
+        self.write(entry)
+
+    def write(self, entry):
+        self.buffer.append(json.dumps(entry, default=repr))
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.file.write('\n'.join(self.buffer) + '\n')
+            self.buffer = []
+
+    def close(self):
+        """Writes the pending events (but doesn't close file)."""
+        self.flush_children()
+        self.flush()
+
+
+def expand(node, problem, hooks):
+    """Expands node, reporting it (and its children) to hooks, if any."""
+    if hooks is None:
+        return node.expand(problem)
+    hooks.on_expand(node)
+    children = node.expand(problem)
+    for child in children:
+        hooks.on_generate(child)
+    return children
+
+
+# ______________________________________________________________________________
+# Search budgets
+
+
+class BudgetExhausted:
+    """The result of a search which ran out of budget: why ('nodes', 'time'
+    or 'frontier'), the node it was about to expand and the number of nodes
+    expanded, the frontier size and the time elapsed until then. It's false,
+    so that 'if result:' still only holds for a goal node."""
+
+    def __init__(self, reason, node, expanded, frontier_size, elapsed):
+        self.reason = reason
+        self.node = node
+        self.expanded = expanded
+        self.frontier_size = frontier_size
+        self.elapsed = elapsed
+
+    def __bool__(self):
+        return False
+
+    def __repr__(self):
+        return "<BudgetExhausted {} after {} expansions>".format(self.reason, self.expanded)
+
+
+class Budget:
+    """Limits a search to max_nodes expansions, to 'seconds' seconds of wall
+    clock time and to a frontier of at most max_frontier nodes (None means no
+    limit; the recursive searches, depth_limited_search,
+    recursive_best_first_search and and_or_graph_search, count the current
+    path as their frontier, and the local searches have none).
+    The search drivers call spend before each expansion; the clock
+    starts on the first call, so a Budget is meant for a single search (the
+    iterations of iterative_deepening_search all share it). The clock is only
+    read every 'check_every' expansions, to keep the check cheap."""
+
+    def __init__(self, max_nodes=None, seconds=None, max_frontier=None, check_every=64):
+        self.max_nodes = max_nodes
+        self.seconds = seconds
+        self.max_frontier = max_frontier
+        self.check_every = check_every
+        self.expanded = 0
+        self.started = self.deadline = None
+
+    def spend(self, node, frontier_size=0):
+        """Counts the expansion of node. Returns a BudgetExhausted if any of
+        the limits was reached, and None otherwise."""
+        if self.started is None:
+            self.started = perf_counter()
+            if self.seconds is not None:
+                self.deadline = self.started + self.seconds
+        reason = None
+        if self.max_nodes is not None and self.expanded >= self.max_nodes:
+            reason = 'nodes'
+        elif self.max_frontier is not None and frontier_size > self.max_frontier:
+            reason = 'frontier'
+        elif (self.deadline is not None and self.expanded % self.check_every == 0
+              and perf_counter() >= self.deadline):
+            reason = 'time'
+        if reason is not None:
+            return BudgetExhausted(reason, node, self.expanded, frontier_size,
+                                   perf_counter() - self.started)
+        self.expanded += 1
+        return None
+
+
+# ______________________________________________________________________________
+# Checkpoints
+
+
+class Checkpoint:
+    """Saves the frontier (and explored set) of a search to 'path', so that it
+    can be resumed later, exactly where it was, by a search given a Checkpoint
+    with resume=True. The search is saved every 'every' expansions (unless
+    it's None) and as soon as the process receives one of save_signals (by
+    default SIGUSR1, where there's one: not on Windows); on one of
+    stop_signals (by default SIGTERM) it's saved and the process exits. The
+    handlers are only installed while in a 'with' block (in the main thread).
+
+    The states are stored with problem.encode_state, and each node with its
+    action, path cost, depth and f value, but not its parent: after resuming,
+    the path to a goal starts at the node taken from the checkpoint. Only
+    depth_first_tree_search, depth_first_graph_search and
+    best_first_graph_search (and its variants) take a checkpoint."""
+
+    def __init__(self, path, every=10000, resume=False,
+                 save_signals=None, stop_signals=None):
+        self.path = path
+        self.every = every
+        self.resume = resume
+        if save_signals is None:
+            usr1 = getattr(signal, 'SIGUSR1', None)
+            save_signals = () if usr1 is None else (usr1,)
+        if stop_signals is None:
+            stop_signals = (signal.SIGTERM,)
+        self.save_signals = tuple(save_signals)
+        self.stop_signals = tuple(stop_signals)
+        self.expanded = 0
+        self.requested = None
+        self.handlers = {}
+
+    def __enter__(self):
+        for signum in self.save_signals + self.stop_signals:
+            self.handlers[signum] = signal.signal(signum, self.request)
+        return self
+
+    def __exit__(self, *exc_info):
+        for signum, handler in self.handlers.items():
+            signal.signal(signum, handler)
+        self.handlers = {}
+
+    def request(self, signum, frame):
+        self.requested = signum
+
+    def restore(self, problem, frontier, explored=None):
+        """Returns the frontier (a list of nodes) and explored set stored in
+        the checkpoint when resuming from an existing one, and the given
+        frontier and explored set otherwise."""
+        if not self.resume or not os.path.exists(self.path):
+            return frontier, explored
+        with open(self.path, 'rb') as file:
+            data = pickle.load(file)
+        self.expanded = data['expanded']
+        frontier = []
+        for state, action, path_cost, depth, f in data['frontier']:
+            node = Node(problem.decode_state(state), None, action, path_cost)
+            node.depth = depth
+            if f is not None:
+                node.f = f
+            frontier.append(node)
+        if data['explored'] is not None:
+            explored = {problem.decode_state(state) for state in data['explored']}
+        return frontier, explored
+
+    def tick(self, problem, frontier, explored=None):
+        """Called by the search before each expansion: saves the frontier
+        (a list, deque or PriorityQueue) and explored set if it's time to."""
+        if self.requested is None and (self.every is None or self.expanded % self.every):
+            self.expanded += 1
+            return
+        self.save(problem, frontier, explored)
+        self.expanded += 1
+        if self.requested in self.stop_signals:
+            sys.exit(128 + self.requested)
+        self.requested = None
+
+    def save(self, problem, frontier, explored=None):
+        if isinstance(frontier, PriorityQueue):
+            frontier = [node for _, node in frontier.heap]
+        data = {
+            'expanded': self.expanded,
+            'frontier': [(problem.encode_state(node.state), node.action, node.path_cost,
+                          node.depth, getattr(node, 'f', None)) for node in frontier],
+            'explored': None if explored is None else
+                        [problem.encode_state(state) for state in explored],
+        }
+        # Written aside and then renamed, so that a crash while saving never
+        # leaves a broken checkpoint behind.
+        with open(self.path + '.tmp', 'wb') as file:
+            pickle.dump(data, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + '.tmp', self.path)
+
+
 # ______________________________________________________________________________
 
 
@@ -175,7 +624,7 @@ class SimpleProblemSolvingAgentProgram:
 # Uninformed Search algorithms
 
 
-def breadth_first_tree_search(problem):
+def breadth_first_tree_search(problem, hooks=None, budget=None):
     """
     [Figure 3.7]
     Search the shallowest nodes in the search tree first.
@@ -189,31 +638,54 @@ def breadth_first_tree_search(problem):
     while frontier:
         node = frontier.popleft()
         if problem.goal_test(node.state):
+            if hooks is not None:
+                hooks.on_goal(node)
             return node
-        frontier.extend(node.expand(problem))
+        if budget is not None:
+            exhausted = budget.spend(node, len(frontier))
+            if exhausted is not None:
+                return exhausted
+        frontier.extend(expand(node, problem, hooks))
+        if hooks is not None:
+            hooks.on_frontier_size(len(frontier))
     return None
 
 
-def depth_first_tree_search(problem):
+def depth_first_tree_search(problem, hooks=None, budget=None, checkpoint=None, frontier=None):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
     Search through the successors of a problem to find a goal.
-    The argument frontier should be an empty queue.
+    The argument frontier, if given, is the list of nodes to resume the
+    search from (a stack: the last one is expanded first), instead of the
+    initial state; the search works on that same list.
     Repeats infinitely in case of loops.
     """
 
-    frontier = [Node(problem.initial)]  # Stack
+    if frontier is None:
+        frontier = [Node(problem.initial)]  # Stack
+    if checkpoint is not None:
+        frontier, _ = checkpoint.restore(problem, frontier)
 
     while frontier:
+        if checkpoint is not None:
+            checkpoint.tick(problem, frontier)
         node = frontier.pop()
         if problem.goal_test(node.state):
+            if hooks is not None:
+                hooks.on_goal(node)
             return node
-        frontier.extend(node.expand(problem))
+        if budget is not None:
+            exhausted = budget.spend(node, len(frontier))
+            if exhausted is not None:
+                return exhausted
+        frontier.extend(expand(node, problem, hooks))
+        if hooks is not None:
+            hooks.on_frontier_size(len(frontier))
     return None
 
 
-def depth_first_graph_search(problem):
+def depth_first_graph_search(problem, hooks=None, budget=None, checkpoint=None):
     """
     [Figure 3.7]
     Search the deepest nodes in the search tree first.
@@ -225,17 +697,32 @@ def depth_first_graph_search(problem):
     frontier = [(Node(problem.initial))]  # Stack
 
     explored = set()
+    if checkpoint is not None:
+        frontier, explored = checkpoint.restore(problem, frontier, explored)
     while frontier:
+        if checkpoint is not None:
+            checkpoint.tick(problem, frontier, explored)
         node = frontier.pop()
         if problem.goal_test(node.state):
+            if hooks is not None:
+                hooks.on_goal(node)
             return node
+        if budget is not None:
+            exhausted = budget.spend(node, len(frontier))
+            if exhausted is not None:
+                return exhausted
         explored.add(node.state)
-        frontier.extend(child for child in node.expand(problem)
-                        if child.state not in explored and child not in frontier)
+        for child in expand(node, problem, hooks):
+            if child.state not in explored and child not in frontier:
+                frontier.append(child)
+            elif hooks is not None:
+                hooks.on_prune(child)
+        if hooks is not None:
+            hooks.on_frontier_size(len(frontier))
     return None
 
 
-def breadth_first_graph_search(problem):
+def breadth_first_graph_search(problem, hooks=None, budget=None):
     """[Figure 3.11]
     Note that this function can be implemented in a
     single line as below:
@@ -243,21 +730,33 @@ def breadth_first_graph_search(problem):
     """
     node = Node(problem.initial)
     if problem.goal_test(node.state):
+        if hooks is not None:
+            hooks.on_goal(node)
         return node
     frontier = deque([node])
     explored = set()
     while frontier:
         node = frontier.popleft()
+        if budget is not None:
+            exhausted = budget.spend(node, len(frontier))
+            if exhausted is not None:
+                return exhausted
         explored.add(node.state)
-        for child in node.expand(problem):
+        for child in expand(node, problem, hooks):
             if child.state not in explored and child not in frontier:
                 if problem.goal_test(child.state):
+                    if hooks is not None:
+                        hooks.on_goal(child)
                     return child
                 frontier.append(child)
+            elif hooks is not None:
+                hooks.on_prune(child)
+        if hooks is not None:
+            hooks.on_frontier_size(len(frontier))
     return None
 
 
-def best_first_graph_search(problem, f, display=False):
+def best_first_graph_search(problem, f, display=False, hooks=None, budget=None, checkpoint=None):
     """Search the nodes with the lowest f scores first.
     You specify the function f(node) that you want to minimize; for example,
     if f is a heuristic estimate to the goal, then we have greedy best
@@ -270,39 +769,66 @@ def best_first_graph_search(problem, f, display=False):
     frontier = PriorityQueue('min', f)
     frontier.append(node)
     explored = set()
+    if checkpoint is not None:
+        nodes, explored = checkpoint.restore(problem, [node], explored)
+        # Restored in the same order, the heap pops the nodes in the same order
+        frontier.heap = [(f(node), node) for node in nodes]
     while frontier:
+        if checkpoint is not None:
+            checkpoint.tick(problem, frontier, explored)
         node = frontier.pop()
         if problem.goal_test(node.state):
             if display:
                 print(len(explored), "paths have been expanded and", len(frontier), "paths remain in the frontier")
+            if hooks is not None:
+                hooks.on_goal(node)
             return node
+        if budget is not None:
+            exhausted = budget.spend(node, len(frontier))
+            if exhausted is not None:
+                return exhausted
         explored.add(node.state)
-        for child in node.expand(problem):
+        for child in expand(node, problem, hooks):
             if child.state not in explored and child not in frontier:
                 frontier.append(child)
             elif child in frontier:
                 if f(child) < frontier[child]:
                     del frontier[child]
                     frontier.append(child)
+                elif hooks is not None:
+                    hooks.on_prune(child)
+            elif hooks is not None:
+                hooks.on_prune(child)
+        if hooks is not None:
+            hooks.on_frontier_size(len(frontier))
     return None
 
 
-def uniform_cost_search(problem, display=False):
+def uniform_cost_search(problem, display=False, hooks=None, budget=None, checkpoint=None):
     """[Figure 3.14]"""
-    return best_first_graph_search(problem, lambda node: node.path_cost, display)
+    return best_first_graph_search(problem, lambda node: node.path_cost, display, hooks, budget,
+                                   checkpoint)
 
 
-def depth_limited_search(problem, limit=50):
+def depth_limited_search(problem, limit=50, hooks=None, budget=None):
     """[Figure 3.17]"""
 
     def recursive_dls(node, problem, limit):
         if problem.goal_test(node.state):
+            if hooks is not None:
+                hooks.on_goal(node)
             return node
         elif limit == 0:
+            if hooks is not None:
+                hooks.on_prune(node)
             return 'cutoff'
         else:
+            if budget is not None:
+                exhausted = budget.spend(node, node.depth)
+                if exhausted is not None:
+                    return exhausted
             cutoff_occurred = False
-            for child in node.expand(problem):
+            for child in expand(node, problem, hooks):
                 result = recursive_dls(child, problem, limit - 1)
                 if result == 'cutoff':
                     cutoff_occurred = True
@@ -314,10 +840,10 @@ def depth_limited_search(problem, limit=50):
     return recursive_dls(Node(problem.initial), problem, limit)
 
 
-def iterative_deepening_search(problem):
+def iterative_deepening_search(problem, hooks=None, budget=None):
     """[Figure 3.18]"""
     for depth in range(sys.maxsize):
-        result = depth_limited_search(problem, depth)
+        result = depth_limited_search(problem, depth, hooks, budget)
         if result != 'cutoff':
             return result
 
@@ -326,7 +852,11 @@ def iterative_deepening_search(problem):
 # Bidirectional Search
 # Pseudocode from https://webdocs.cs.ualberta.ca/%7Eholte/Publications/MM-AAAI2016.pdf
 
-def bidirectional_search(problem):
+def bidirectional_search(problem, hooks=None, budget=None):
+    """Meets in the middle (MM) search. Returns the cost of an optimal path
+    (infinity if there's none), or a BudgetExhausted. Since it doesn't
+    return a node, the hooks aren't told about a goal; the frontier size is
+    that of both open lists."""
     e = 0
     if isinstance(problem, GraphProblem):
         e = problem.find_min_edge()
@@ -338,13 +868,19 @@ def bidirectional_search(problem):
     def extend(U, open_dir, open_other, g_dir, g_other, closed_dir):
         """Extend search in given direction"""
         n = find_key(C, open_dir, g_dir)
+        if budget is not None:
+            exhausted = budget.spend(n, len(openF) + len(openB))
+            if exhausted is not None:
+                return exhausted, open_dir, closed_dir, g_dir
 
         open_dir.remove(n)
         closed_dir.append(n)
 
-        for c in n.expand(problem):
+        for c in expand(n, problem, hooks):
             if c in open_dir or c in closed_dir:
                 if g_dir[c] <= problem.path_cost(g_dir[n], n.state, None, c.state):
+                    if hooks is not None:
+                        hooks.on_prune(c)
                     continue
 
                 open_dir.remove(c)
@@ -398,6 +934,10 @@ def bidirectional_search(problem):
         else:
             # Extend backward
             U, openB, closedB, gB = extend(U, openB, openF, gB, gF, closedB)
+        if isinstance(U, BudgetExhausted):
+            return U
+        if hooks is not None:
+            hooks.on_frontier_size(len(openF) + len(openB))
 
     return np.inf
 
@@ -410,17 +950,18 @@ greedy_best_first_graph_search = best_first_graph_search
 
 
 # Greedy best-first search is accomplished by specifying f(n) = h(n).
-def greedy_search(problem, h=None):
+def greedy_search(problem, h=None, hooks=None, budget=None, checkpoint=None):
     """f(n) = h(n)"""
     h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, h)
+    return best_first_graph_search(problem, h, hooks=hooks, budget=budget, checkpoint=checkpoint)
 
-def astar_search(problem, h=None, display=False):
+def astar_search(problem, h=None, display=False, hooks=None, budget=None, checkpoint=None):
     """A* search is best-first graph search with f(n) = g(n)+h(n).
     You need to specify the h function when you call astar_search, or
     else in your Problem subclass."""
     h = memoize(h or problem.h, 'h')
-    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display)
+    return best_first_graph_search(problem, lambda n: n.path_cost + h(n), display, hooks, budget,
+                                   checkpoint)
 
 
 # ______________________________________________________________________________
@@ -603,14 +1144,20 @@ class PlanRoute(Problem):
 # Other search algorithms
 
 
-def recursive_best_first_search(problem, h=None):
+def recursive_best_first_search(problem, h=None, hooks=None, budget=None):
     """[Figure 3.26]"""
     h = memoize(h or problem.h, 'h')
 
     def RBFS(problem, node, flimit):
         if problem.goal_test(node.state):
+            if hooks is not None:
+                hooks.on_goal(node)
             return node, 0  # (The second value is immaterial)
-        successors = node.expand(problem)
+        if budget is not None:
+            exhausted = budget.spend(node, node.depth)
+            if exhausted is not None:
+                return exhausted, np.inf
+        successors = expand(node, problem, hooks)
         if len(successors) == 0:
             return None, np.inf
         for s in successors:
@@ -620,6 +1167,8 @@ def recursive_best_first_search(problem, h=None):
             successors.sort(key=lambda x: x.f)
             best = successors[0]
             if best.f > flimit:
+                if hooks is not None:
+                    hooks.on_prune(best)
                 return None, best.f
             if len(successors) > 1:
                 alternative = successors[1].f
@@ -635,18 +1184,29 @@ def recursive_best_first_search(problem, h=None):
     return result
 
 
-def hill_climbing(problem):
+def hill_climbing(problem, hooks=None, budget=None):
     """
     [Figure 4.2]
     From the initial node, keep choosing the neighbor with highest value,
-    stopping when no neighbor is better.
+    stopping when no neighbor is better. The neighbors not chosen are
+    pruned, and the frontier size is their number.
     """
     current = Node(problem.initial)
     while True:
-        neighbors = current.expand(problem)
+        if budget is not None:
+            exhausted = budget.spend(current)
+            if exhausted is not None:
+                return exhausted
+        neighbors = expand(current, problem, hooks)
+        if hooks is not None:
+            hooks.on_frontier_size(len(neighbors))
         if not neighbors:
             break
         neighbor = argmax_random_tie(neighbors, key=lambda node: problem.value(node.state))
+        if hooks is not None:
+            for node in neighbors:
+                if node is not neighbor:
+                    hooks.on_prune(node)
         if problem.value(neighbor.state) <= problem.value(current.state):
             break
         current = neighbor
@@ -658,15 +1218,22 @@ def exp_schedule(k=20, lam=0.005, limit=100):
     return lambda t: (k * np.exp(-lam * t) if t < limit else 0)
 
 
-def simulated_annealing(problem, schedule=exp_schedule()):
+def simulated_annealing(problem, schedule=exp_schedule(), hooks=None, budget=None):
     """[Figure 4.5] CAUTION: This differs from the pseudocode as it
-    returns a state instead of a Node."""
+    returns a state instead of a Node. The frontier size reported to the
+    hooks is the number of neighbors of the current node."""
     current = Node(problem.initial)
     for t in range(sys.maxsize):
         T = schedule(t)
         if T == 0:
             return current.state
-        neighbors = current.expand(problem)
+        if budget is not None:
+            exhausted = budget.spend(current)
+            if exhausted is not None:
+                return exhausted
+        neighbors = expand(current, problem, hooks)
+        if hooks is not None:
+            hooks.on_frontier_size(len(neighbors))
         if not neighbors:
             return current.state
         next_choice = random.choice(neighbors)
@@ -675,7 +1242,7 @@ def simulated_annealing(problem, schedule=exp_schedule()):
             current = next_choice
 
 
-def simulated_annealing_full(problem, schedule=exp_schedule()):
+def simulated_annealing_full(problem, schedule=exp_schedule(), hooks=None, budget=None):
     """ This version returns all the states encountered in reaching
     the goal state."""
     states = []
@@ -685,7 +1252,13 @@ def simulated_annealing_full(problem, schedule=exp_schedule()):
         T = schedule(t)
         if T == 0:
             return states
-        neighbors = current.expand(problem)
+        if budget is not None:
+            exhausted = budget.spend(current)
+            if exhausted is not None:
+                return exhausted
+        neighbors = expand(current, problem, hooks)
+        if hooks is not None:
+            hooks.on_frontier_size(len(neighbors))
         if not neighbors:
             return current.state
         next_choice = random.choice(neighbors)
@@ -694,7 +1267,7 @@ def simulated_annealing_full(problem, schedule=exp_schedule()):
             current = next_choice
 
 
-def and_or_graph_search(problem):
+def and_or_graph_search(problem, hooks=None, budget=None):
     """[Figure 4.11]Used when the environment is nondeterministic and completely observable.
     Contains OR nodes where the agent is free to choose any action.
     After every action there is an AND node which contains all possible states
@@ -702,32 +1275,55 @@ def and_or_graph_search(problem):
     The agent must be able to handle all possible states of the AND node (as it
     may end up in any of them).
     Returns a conditional plan to reach goal state,
-    or failure if the former is not possible."""
+    or failure if the former is not possible (or a BudgetExhausted).
+    The hooks get a Node for each state: those of the OR nodes are expanded,
+    those of the AND nodes generated, and those already in the path pruned;
+    as in the other recursive searches, the path is the frontier."""
 
     # functions used by and_or_search
-    def or_search(state, problem, path):
+    def or_search(state, problem, path, node):
         """returns a plan as a list of actions"""
         if problem.goal_test(state):
+            if hooks is not None:
+                hooks.on_goal(node)
             return []
         if state in path:
+            if hooks is not None:
+                hooks.on_prune(node)
             return None
+        if budget is not None:
+            exhausted = budget.spend(node or Node(state), len(path))
+            if exhausted is not None:
+                return exhausted
+        if hooks is not None:
+            hooks.on_expand(node)
+            hooks.on_frontier_size(len(path) + 1)
         for action in problem.actions(state):
             plan = and_search(problem.result(state, action),
-                              problem, path + [state, ])
+                              problem, path + [state, ], node, action)
+            if isinstance(plan, BudgetExhausted):
+                return plan
             if plan is not None:
                 return [action, plan]
 
-    def and_search(states, problem, path):
+    def and_search(states, problem, path, parent, action):
         """Returns plan in form of dictionary where we take action plan[s] if we reach state s."""
         plan = {}
         for s in states:
-            plan[s] = or_search(s, problem, path)
+            node = None
+            if hooks is not None:
+                node = Node(s, parent, action)
+                hooks.on_generate(node)
+            plan[s] = or_search(s, problem, path, node)
+            if isinstance(plan[s], BudgetExhausted):
+                return plan[s]
             if plan[s] is None:
                 return None
         return plan
 
     # body of and or search
-    return or_search(problem.initial, problem, [])
+    return or_search(problem.initial, problem, [],
+                     Node(problem.initial) if hooks is not None else None)
 
 
 # Pre-defined actions for PeakFindingProblem
@@ -1517,35 +2113,121 @@ def mutate_boggle(board):
 # Code to compare searchers on various problems.
 
 
+class CallTimer:
+    """Keeps the number of calls to a function, the total, minimum and maximum
+    time they took, and a histogram of their durations with power of two
+    buckets (the bucket k counts the calls which took [2^k, 2^(k+1)[ ns)."""
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.histogram = Counter()
+
+    def add(self, seconds):
+        self.calls += 1
+        self.total += seconds
+        if seconds < self.min:
+            self.min = seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.histogram[int(seconds * 1e9).bit_length() - 1] += 1
+
+    def summary(self):
+        return {
+            'calls': self.calls,
+            'total': self.total,
+            'mean': self.total / self.calls if self.calls else 0.0,
+            'min': self.min if self.calls else 0.0,
+            'max': self.max,
+            'histogram': {2 ** k: count for k, count in sorted(self.histogram.items())},
+        }
+
+
 class InstrumentedProblem(Problem):
-    """Delegates to a problem, and keeps statistics."""
+    """Delegates to a problem, and keeps statistics. If timed is True, it also
+    times every call to actions, result, goal_test and h (see timings)."""
 
-    def __init__(self, problem):
+    def __init__(self, problem, timed=False):
         self.problem = problem
         self.succs = self.goal_tests = self.states = 0
         self.found = None
+        self.timers = None
+        if timed:
+            self.timers = {name: CallTimer() for name in ('actions', 'result', 'goal_test', 'h')}
+            self.max_frontier = 1
+            self.started = perf_counter()
 
     def actions(self, state):
         self.succs += 1
-        return self.problem.actions(state)
+        if self.timers is None:
+            return self.problem.actions(state)
+        start = perf_counter()
+        actions = self.problem.actions(state)
+        self.timers['actions'].add(perf_counter() - start)
+        return actions
 
     def result(self, state, action):
         self.states += 1
-        return self.problem.result(state, action)
+        if self.timers is None:
+            return self.problem.result(state, action)
+        start = perf_counter()
+        result = self.problem.result(state, action)
+        self.timers['result'].add(perf_counter() - start)
+        # Every generated node enters the frontier, and leaves it when it's
+        # goal tested: exact for the tree searches, an upper bound otherwise.
+        self.max_frontier = max(self.max_frontier, self.states - self.goal_tests + 1)
+        return result
 
     def goal_test(self, state):
         self.goal_tests += 1
-        result = self.problem.goal_test(state)
+        if self.timers is None:
+            result = self.problem.goal_test(state)
+        else:
+            start = perf_counter()
+            result = self.problem.goal_test(state)
+            self.timers['goal_test'].add(perf_counter() - start)
         if result:
             self.found = state
         return result
 
+    def h(self, node):
+        if self.timers is None:
+            return self.problem.h(node)
+        start = perf_counter()
+        result = self.problem.h(node)
+        self.timers['h'].add(perf_counter() - start)
+        return result
+
     def path_cost(self, c, state1, action, state2):
         return self.problem.path_cost(c, state1, action, state2)
 
     def value(self, state):
         return self.problem.value(state)
 
+    def encode_state(self, state):
+        return self.problem.encode_state(state)
+
+    def decode_state(self, data):
+        return self.problem.decode_state(data)
+
+    def timings(self):
+        """Returns the statistics kept in timed mode: a summary of each
+        callback which was called (times in seconds), the time elapsed since
+        the problem was instrumented, the nodes expanded per second and the
+        largest size of the frontier."""
+        if self.timers is None:
+            raise ValueError("InstrumentedProblem was not created with timed=True")
+        elapsed = perf_counter() - self.started
+        return {
+            'callbacks': {name: timer.summary()
+                          for name, timer in self.timers.items() if timer.calls},
+            'elapsed': elapsed,
+            'nodes_per_second': self.succs / elapsed if elapsed else 0.0,
+            'max_frontier': self.max_frontier,
+        }
+
     def __getattr__(self, attr):
         return getattr(self.problem, attr)
 
@@ -0,0 +1,388 @@
+# service.py: Servidor assíncrono (asyncio) que resolve tabuleiros takuzu.
+# Os pedidos chegam por um socket local (Unix ou TCP em localhost), no mesmo
+# formato aceite por takuzu.py, e são resolvidos por um conjunto de processos
+# que se mantém ativo entre pedidos.
+
+import argparse
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from multiprocessing import Array
+
+from cache import MISSING, SolutionCache
+from search import Problem, depth_first_tree_search
+from takuzu import MALFORMED, NO_SOLUTION, Board, Takuzu, solve
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a search goes past the deadline of its request."""
+
+
+class RequestCancelled(Exception):
+    """Raised when a search is aborted because its request was cancelled."""
+
+
+class DeadlineProblem(Problem):
+    """Delegates to a problem, and aborts the search once the given deadline
+    (in time.monotonic() seconds, None for no deadline) has passed, raising
+    DeadlineExceeded, or once the function 'cancelled' returns true, raising
+    RequestCancelled."""
+
+    def __init__(self, problem, deadline, cancelled=None):
+        self.problem = problem
+        self.deadline = deadline
+        self.cancelled = cancelled
+
+    def actions(self, state):
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise DeadlineExceeded
+        if self.cancelled is not None and self.cancelled():
+            raise RequestCancelled
+        return self.problem.actions(state)
+
+    def result(self, state, action):
+        return self.problem.result(state, action)
+
+    def goal_test(self, state):
+        return self.problem.goal_test(state)
+
+    def path_cost(self, c, state1, action, state2):
+        return self.problem.path_cost(c, state1, action, state2)
+
+    def __getattr__(self, attr):
+        return getattr(self.problem, attr)
+
+
+# The flags with which the service cancels the search running in each slot
+# (see SolverService.dispatch), in the workers of its pool
+CANCELLED = None
+
+
+def _init_worker(cancelled) -> None:
+    global CANCELLED
+    CANCELLED = cancelled
+
+
+def solve_request(board: Board, deadline: float = None, slot: int = None):
+    """Returns the solution of 'board' (None if it doesn't have one). The
+    search is aborted, raising DeadlineExceeded, once 'deadline' (in
+    time.monotonic() seconds, which all the processes share) has passed, or,
+    raising RequestCancelled, once the flag of 'slot' is set."""
+    if deadline is None and slot is None:
+        goal, _ = solve(board)
+    else:
+        cancelled = partial(CANCELLED.__getitem__, slot) if slot is not None else None
+        goal = depth_first_tree_search(DeadlineProblem(Takuzu(board), deadline, cancelled))
+    return goal.state.board if goal else None
+
+
+def _warm_up() -> int:
+    """Runs once in each worker of the pool, so that all of them are started
+    (with every module imported) before the first request arrives."""
+    return os.getpid()
+
+
+class Request:
+    """A board waiting to be solved, the deadline of its search and the
+    future holding its response."""
+
+    def __init__(self, board: Board, deadline: float, future) -> None:
+        self.board = board
+        self.deadline = deadline
+        self.future = future
+
+
+class SolverService:
+    """Solves the boards sent by its clients in a pool of 'workers' processes.
+
+    Each connection sends any number of boards, in the format read by
+    Board.parse_instance_from_stdin (the size followed by the rows), and
+    gets back, for each one, the solved board (or an error message starting
+    with 'error:') followed by an empty line. Requests wait in a queue of at
+    most 'max_queue' boards: when it's full, the server stops reading from
+    the connections until there's room again. A board is given at most
+    'timeout' seconds from the moment it's read, waiting in the queue
+    included; the boards of a client which disconnects are cancelled, even
+    while being searched. Boards of size up to 'inline_size' are
+    solved directly in the event loop, skipping the round trip to the pool.
+    If a SolutionCache is given, boards found in it aren't searched at all."""
+
+    def __init__(self, workers: int = None, max_queue: int = 1024,
+                 timeout: float = None, inline_size: int = 6, cache=None) -> None:
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.inline_size = inline_size
+        self.cache = cache
+        self.queue = asyncio.Queue(max_queue)
+        self.pool = None
+        self.dispatchers = []
+        # A flag per dispatcher, set to abort the search it's waiting for
+        self.cancelled = Array('b', self.workers, lock=False)
+
+    async def start(self) -> None:
+        """Starts the (warm) process pool and the tasks which feed it."""
+        loop = asyncio.get_running_loop()
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                        initargs=(self.cancelled,))
+        await asyncio.gather(*(loop.run_in_executor(self.pool, _warm_up)
+                               for _ in range(self.workers)))
+        self.dispatchers = [asyncio.create_task(self.dispatch(slot))
+                            for slot in range(self.workers)]
+
+    async def stop(self) -> None:
+        """Stops the dispatchers, and the pool once the searches still
+        running (which are cancelled) return."""
+        for dispatcher in self.dispatchers:
+            dispatcher.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        self.cancelled[:] = [1] * self.workers
+        self.pool.shutdown(cancel_futures=True)
+
+    def abort(self, slot: int, future) -> None:
+        """Aborts the search of the dispatcher 'slot' if 'future' (that of
+        its request) was cancelled."""
+        if future.cancelled():
+            self.cancelled[slot] = 1
+
+    async def dispatch(self, slot: int) -> None:
+        """Sends the queued requests to the pool, one at a time. Requests
+        which were cancelled or went past their deadline while waiting in the
+        queue are skipped, and those cancelled while being searched are
+        aborted, through the flag 'slot' of the service."""
+        loop = asyncio.get_running_loop()
+        while True:
+            request = await self.queue.get()
+            try:
+                if request.future.done():
+                    continue
+                if request.deadline is not None and time.monotonic() > request.deadline:
+                    raise DeadlineExceeded
+                self.cancelled[slot] = 0
+                request.future.add_done_callback(partial(self.abort, slot))
+                solution = await loop.run_in_executor(
+                    self.pool, solve_request, request.board, request.deadline, slot)
+                if not request.future.done():
+                    request.future.set_result(solution)
+            except Exception as error:
+                if not request.future.done():
+                    request.future.set_exception(error)
+            finally:
+                self.queue.task_done()
+
+    async def submit(self, board: Board, deadline: float = None) -> str:
+        """Solves 'board', searching until 'deadline' (in time.monotonic()
+        seconds), and returns the text of the response."""
+        if self.cache is not None:
+            solution = self.cache.get(board)
+            if solution is not MISSING:
+                return str(solution) if solution else NO_SOLUTION
+        try:
+            solution = await self.solve(board, deadline)
+        except DeadlineExceeded:
+            return "error: timeout"
+        except Exception as error:
+            return "error: " + repr(error)
+        if self.cache is not None:
+            self.cache.put(board, solution)
+        return str(solution) if solution else NO_SOLUTION
+
+    async def solve(self, board: Board, deadline: float = None):
+        """Returns the solution of 'board' (None if it doesn't have one),
+        either solving it inline or through the queue."""
+        if board.size <= self.inline_size:
+            return solve_request(board, deadline)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put(Request(board, deadline, future))
+        try:
+            return await future
+        finally:
+            future.cancel()
+
+    async def handle(self, reader, writer) -> None:
+        """Serves a connection. Its boards are read as they arrive (up to
+        'max_queue' of them ahead of the responses), so that the end of the
+        connection is seen while they're being solved: the client is then
+        gone, and those still waiting or being searched are cancelled, while
+        the responses already known (such as that of a board cut short by
+        the end) are still sent. The responses are sent in the order of the
+        boards."""
+        loop = asyncio.get_running_loop()
+        responses = asyncio.Queue()
+        room = asyncio.Semaphore(self.queue.maxsize)
+        responder = asyncio.create_task(
+            self.respond(responses, room, writer, asyncio.current_task()))
+        pending = set()
+        try:
+            ended = False
+            while not ended:
+                header = await reader.readline()
+                if not header:
+                    break
+                if not header.strip():
+                    continue
+                deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+                try:
+                    size = int(header)
+                    lines = [header.decode()]
+                    for _ in range(size):
+                        line = await reader.readline()
+                        if not line:
+                            ended = True
+                            break
+                        lines.append(line.decode())
+                    board = next(Board.parse_instances(lines))
+                except (ValueError, StopIteration):
+                    response = loop.create_future()
+                    response.set_result(MALFORMED)
+                else:
+                    response = asyncio.create_task(self.submit(board, deadline))
+                    pending.add(response)
+                    response.add_done_callback(pending.discard)
+                await room.acquire()
+                responses.put_nowait(response)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            responder.cancel()
+        finally:
+            for response in pending:
+                response.cancel()
+            responses.put_nowait(None)
+            await asyncio.gather(responder, *pending, return_exceptions=True)
+            writer.close()
+
+    async def respond(self, responses, room, writer, handler) -> None:
+        """Writes the 'responses' (futures of their text) of a connection,
+        in order, releasing 'room' for each one, until the first which was
+        cancelled or the end (None). If the client is gone, its 'handler' is
+        cancelled."""
+        try:
+            while True:
+                response = await responses.get()
+                if response is None:
+                    return
+                try:
+                    text = await response
+                except asyncio.CancelledError:
+                    if response.cancelled():
+                        return
+                    raise
+                writer.write(text.encode() + b"\n\n")
+                await writer.drain()
+                room.release()
+        except ConnectionError:
+            handler.cancel()
+
+
+async def serve(args) -> None:
+    cache = SolutionCache(args.cache_size, args.cache_file) if args.cache_size else None
+    service = SolverService(args.workers, args.max_queue, args.timeout,
+                            args.inline_size, cache)
+    await service.start()
+    if args.unix:
+        server = await asyncio.start_unix_server(service.handle, args.unix)
+    else:
+        server = await asyncio.start_server(service.handle, args.host, args.port)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, asyncio.current_task().cancel)
+    try:
+        async with server:
+            await server.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await service.stop()
+        if cache is not None and args.cache_file:
+            cache.save()
+
+
+def split_requests(lines) -> list:
+    """Splits 'lines' into the boards the service reads from them (as
+    SolverService.handle does), well formed or not: one for each response.
+    Returns the lines of each one, and whether the last one is complete (it
+    may end before its rows do)."""
+    requests = []
+    complete = True
+    lines = iter(lines)
+    for header in lines:
+        if not header.strip():
+            continue
+        try:
+            size = max(int(header), 0)
+        except ValueError:
+            size = 0
+        requests.append([header, *islice(lines, size)])
+        complete = len(requests[-1]) == size + 1
+    return requests, complete
+
+
+def request(board_text: str, unix: str = None, host: str = 'localhost',
+            port: int = 8765) -> str:
+    """Sends the boards in 'board_text' to a running service, and returns its
+    responses (blocking)."""
+    requests, complete = split_requests(board_text.splitlines())
+    # The service would only answer a board cut short once the connection
+    # ends, with the error of a malformed board, which is given here instead
+    if not complete:
+        requests.pop()
+    if unix:
+        connection = socket.socket(socket.AF_UNIX)
+        connection.connect(unix)
+    else:
+        connection = socket.create_connection((host, port))
+    with connection, connection.makefile('rw') as stream:
+        stream.write(''.join(line + '\n' for lines in requests for line in lines))
+        stream.flush()
+        responses = []
+        for _ in requests:
+            lines = []
+            for line in stream:
+                if line == '\n':
+                    break
+                lines.append(line)
+            responses.append(''.join(lines))
+    if not complete:
+        responses.append(MALFORMED + '\n')
+    return '\n'.join(responses)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serves takuzu solutions over a local socket.")
+    parser.add_argument('--unix', metavar='PATH', default=None,
+                        help="listen on (or connect to) a Unix socket instead of TCP")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: one per core)")
+    parser.add_argument('--max-queue', type=int, default=1024,
+                        help="number of boards waiting to be solved before "
+                             "the server stops reading requests")
+    parser.add_argument('--timeout', type=float, default=None,
+                        help="seconds of search given to each board")
+    parser.add_argument('--inline-size', type=int, default=6,
+                        help="boards up to this size skip the process pool")
+    parser.add_argument('--cache-size', type=int, default=65536,
+                        help="number of solutions kept in the cache (0 disables it)")
+    parser.add_argument('--cache-file', default=None,
+                        help="file from which the cache is loaded, and to "
+                             "which it's saved when the server stops")
+    parser.add_argument('--connect', action='store_true',
+                        help="act as a client: send the boards read from the "
+                             "standard input to a running server")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.connect:
+        print(request(sys.stdin.read(), args.unix, args.host, args.port))
+    else:
+        asyncio.run(serve(args))
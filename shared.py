@@ -0,0 +1,80 @@
+# shared.py: Tabelas partilhadas entre processos.
+# O processo principal copia as tabelas (arrays NumPy) para segmentos de
+# multiprocessing.shared_memory, uma única vez; os processos de trabalho
+# recebem só os nomes dos segmentos e criam vistas só de leitura sobre eles,
+# pelo que a memória usada não cresce com o número de processos.
+
+import sys
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# The segments attached to by this process, kept open while it runs
+ATTACHED = {}
+
+
+def release(segments: list) -> None:
+    """Closes and unlinks the shared memory 'segments'."""
+    for segment in segments:
+        try:
+            segment.close()
+        except BufferError:
+            # Views of it still exist: it's unmapped when the process exits
+            pass
+        try:
+            segment.unlink()
+        except FileNotFoundError:
+            pass
+    segments.clear()
+
+
+class SharedTables:
+    """The shared memory segments with the tables shared by this process
+    (their owner). The segments are unlinked by close, on leaving a with
+    block, or when the process exits, so they don't outlive it."""
+
+    def __init__(self) -> None:
+        self.segments = []
+        self.finalizer = weakref.finalize(self, release, self.segments)
+
+    def share(self, array) -> tuple:
+        """Copies 'array' to a new shared memory segment. Returns its handle,
+        a picklable (name, shape, dtype) tuple to give to attach."""
+        array = np.ascontiguousarray(array)
+        segment = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self.segments.append(segment)
+        np.ndarray(array.shape, array.dtype, segment.buf)[...] = array
+        return segment.name, array.shape, array.dtype.str
+
+    @property
+    def nbytes(self) -> int:
+        return sum(segment.size for segment in self.segments)
+
+    def close(self) -> None:
+        self.finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def attach(handle: tuple):
+    """Returns a read-only view of the array shared with the handle 'handle'
+    (see SharedTables.share), in a process started by its owner. The segment
+    stays attached until the process exits, and is never unlinked by it."""
+    name, shape, dtype = handle
+    segment = ATTACHED.get(name)
+    if segment is None:
+        if sys.version_info >= (3, 13):
+            segment = shared_memory.SharedMemory(name, track=False)
+        else:
+            # The resource tracker is the owner's, where the segment already
+            # is registered (once), so registering it again changes nothing
+            segment = shared_memory.SharedMemory(name)
+        ATTACHED[name] = segment
+    array = np.ndarray(shape, dtype, segment.buf)
+    array.flags.writeable = False
+    return array
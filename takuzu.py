@@ -7,16 +7,33 @@
 # 99256 João Rocha
 
 import sys
-from numpy import ceil
+from contextlib import nullcontext
+from itertools import islice
 from search import (
+    BranchingFactor,
+    Budget,
+    BudgetExhausted,
+    Checkpoint,
+    FrontierHighWater,
+    HookList,
     InstrumentedProblem,
+    MemoryUsage,
     Problem,
+    SearchTrace,
     Node,
     astar_search,
     breadth_first_tree_search,
     depth_first_tree_search,
     greedy_search,
 )
+from utils import LazyModule
+
+json = LazyModule('json')
+
+# The output for a board which doesn't have a solution
+NO_SOLUTION = "The given takuzu board doesn't have a solution."
+# ... and the answer of batch.py and service.py for one which couldn't be read
+MALFORMED = "error: malformed board"
 
 class TakuzuState:
     state_id = 0
@@ -36,6 +53,27 @@ class TakuzuState:
         return hash(self.id)
 
 
+# Used by Board.from_text to convert the digits of the cells to their values
+CELL_VALUES = bytes.maketrans(b'012', b'\x00\x01\x02')
+WHITESPACE = b' \t\n\r\x0b\x0c'
+# ... and by row_text, to convert them back
+CELL_DIGITS = bytes.maketrans(b'\x00\x01\x02', b'012')
+
+ROW_TEXTS = {}
+ROW_TEXTS_LIMIT = 1 << 16
+
+
+def row_text(cells: bytes) -> str:
+    """Returns the text of a row (its cells separated by tabs) given its
+    cells, as bytes. The texts are cached, up to ROW_TEXTS_LIMIT rows."""
+    text = ROW_TEXTS.get(cells)
+    if text is None:
+        text = "\t".join(cells.translate(CELL_DIGITS).decode())
+        if len(ROW_TEXTS) < ROW_TEXTS_LIMIT:
+            ROW_TEXTS[cells] = text
+    return text
+
+
 class Board:
     """Internal representation of a Takuzu board."""
     EMPTY_CELL = 2
@@ -49,19 +87,11 @@ class Board:
         self.size = size
         if not action:
             self.board = board
-            self.empty_cells = [
-                (row, col)
-                for row in range(self.size)
-                for col in range(self.size)
-                if self.is_empty(self.get_number(row, col))
-            ]
-            self.columns = set()
-            self.rows = set()
-            for x in range(self.size):
-                if self.full_check(self.get_row_count(x)):
-                    self.rows.add(self.get_bin_row(x))
-                if self.full_check(self.get_col_count(x)):
-                    self.columns.add(self.get_bin_col(x))
+            self.empty_cells = [(row, col) for row, line in enumerate(board)
+                                for col, value in enumerate(line) if value == self.EMPTY_CELL]
+            self.rows = {self.line_bin(line) for line in board if self.EMPTY_CELL not in line}
+            self.columns = {self.line_bin(line) for line in zip(*board)
+                            if self.EMPTY_CELL not in line}
             return
 
         x, y, value = action
@@ -160,6 +190,11 @@ class Board:
             count[val] += 1
         return count
 
+    @staticmethod
+    def line_bin(line) -> int:
+        """Returns the binary representation (see get_bin_row) of a full line."""
+        return sum(value << x for x, value in enumerate(line))
+
     def get_bin_row(self, row: int, action=None) -> int:
         """Returns a binary representation of a row. If action=None, returns
         the representation of the row 'row', otherwise returns its representation
@@ -222,15 +257,52 @@ class Board:
             > from sys import stdin
             > stdin.readline()
         """
-        n = int(sys.stdin.readline())
-        board = ()
-        for line in sys.stdin.readlines():
-            board += (list(map(int, line.split())),)
-        return Board(board, n)
+        header, _, text = sys.stdin.buffer.read().lstrip().partition(b'\n')
+        return Board.from_text(int(header), text)
+
+    @staticmethod
+    def parse_instances(stream, errors: bool = False):
+        """Reads a sequence of tests from 'stream' (each one in the format read
+        by parse_instance_from_stdin: the size of the board followed by its
+        rows) and yields a Board instance for each of them, lazily. Blank
+        lines between tests are ignored. 'stream' can be opened in either text
+        or binary mode. A malformed test raises ValueError, unless 'errors'
+        is True: the error is then yielded in its place, and the tests which
+        follow it are still read (from the line after its rows, or after its
+        header if that isn't a size).
+
+        For example:
+            $ cat input_T01 input_T02 | python3 batch.py
+        """
+        lines = (line for line in stream if line.strip())
+        for header in lines:
+            try:
+                n = int(header)
+                text = header[:0].join(islice(lines, n))
+                board = Board.from_text(n, text.encode() if isinstance(text, str) else text)
+            except ValueError as error:
+                if not errors:
+                    raise
+                board = error
+            yield board
+
+    @staticmethod
+    def from_text(size: int, text: bytes):
+        """Returns the Board with the cells in 'text': 'size' rows of 'size'
+        digits (0, 1 or 2 for an empty cell) separated by whitespace. All the
+        cells are converted at once, by translating the digits to their values
+        and deleting the whitespace. Raises ValueError if there aren't exactly
+        size x size cells, or if any of them isn't a 0, 1 or 2."""
+        cells = text.translate(CELL_VALUES, WHITESPACE)
+        if len(cells) != size * size or (cells and max(cells) > Board.EMPTY_CELL):
+            raise ValueError("Expected a {0}x{0} board of 0, 1 and 2 cells".format(size))
+        return Board([list(cells[row * size:(row + 1) * size]) for row in range(size)], size)
 
     def __str__(self) -> str:
-        """Prints the board."""
-        return "\n".join(["\t".join(map(str, row)) for row in self.board])
+        """Prints the board. The text of each row is cached (see row_text):
+        the rows of the solutions of a given size are few different lines,
+        so printing many boards mostly joins cached strings."""
+        return "\n".join(map(row_text, map(bytes, self.board)))
 
 
 class Takuzu(Problem):
@@ -269,6 +341,28 @@ class Takuzu(Problem):
         numbers."""
         return len(state.board.empty_cells) == 0
 
+    def encode_state(self, state: TakuzuState) -> tuple:
+        """Packs 'state' for a checkpoint: its id (which orders the nodes with
+        the same priority), its size and its cells, 2 bits each."""
+        packed = 0
+        for row in state.board.board:
+            for cell in row:
+                packed = packed << 2 | cell
+        size = state.board.size
+        return state.id, size, packed.to_bytes((2 * size * size + 7) // 8, 'big')
+
+    def decode_state(self, data: tuple) -> TakuzuState:
+        """Unpacks a state packed by encode_state. New states will get
+        greater ids than it, as they would have had without the checkpoint."""
+        state_id, size, packed = data
+        packed = int.from_bytes(packed, 'big')
+        cells = [(packed >> 2 * (size * size - 1 - i)) & 0b11 for i in range(size * size)]
+        state = TakuzuState(Board([cells[row * size:(row + 1) * size]
+                                   for row in range(size)], size))
+        state.id = state_id
+        TakuzuState.state_id = max(TakuzuState.state_id, state_id + 1)
+        return state
+
     def h(self, node: Node) -> float:
         """Heuristic function utilized for the A* search."""
 
@@ -307,7 +401,7 @@ class Takuzu(Problem):
                 return 0
             return (calc_line_constraint(node) + calc_adj_constraint(node)) / 2
         
-        return calc_weight(node) * len(board.empty_cells)
+        return calc_weight(node) * len(node.state.board.empty_cells)
 
     def impossible(self, action: tuple, state: TakuzuState) -> bool:
         """Checks whether executing 'action' is impossible or not - that is,
@@ -324,7 +418,7 @@ class Takuzu(Problem):
             return True
 
         row_count, col_count = board.get_row_count(row), board.get_col_count(col)
-        cap = ceil(board.size / 2)
+        cap = (board.size + 1) // 2
         if row_count[value] >= cap or col_count[value] >= cap:
             return True
         if board.action_creates_equal_lines(row_count, col_count, action):
@@ -345,15 +439,160 @@ class Takuzu(Problem):
                 self.possible((row, col, value), state)
 
 
+def node_bytes(node: Node) -> int:
+    """Returns the memory (in bytes) taken by 'node' alone: the Node, its
+    TakuzuState and its Board, with the containers which the Board doesn't
+    share with its parent's (the cells of empty_cells, and the ints in the
+    rows and columns sets, are shared)."""
+    state, board = node.state, node.state.board
+    objects = [node, node.__dict__, state, state.__dict__, board, board.__dict__,
+               board.board, board.empty_cells, board.rows, board.columns]
+    return sum(map(sys.getsizeof, objects)) + sum(map(sys.getsizeof, board.board))
+
+
+def solve(board: Board, search=depth_first_tree_search) -> tuple:
+    """Solves 'board' with the given search strategy. Returns the goal node
+    (None if the board doesn't have a solution) and the instrumented problem,
+    which holds the statistics of the search."""
+    problem = InstrumentedProblem(Takuzu(board))
+    return search(problem), problem
+
+
+def print_timings(timings: dict, file=sys.stdout) -> None:
+    """Prints the statistics of InstrumentedProblem.timings, one line per
+    callback and a histogram of the durations of its calls."""
+    for name, summary in timings['callbacks'].items():
+        print("{}: {} calls, {:.3f} ms total, {:.1f} us/call (min {:.1f}, max {:.1f})".format(
+            name, summary['calls'], summary['total'] * 1e3, summary['mean'] * 1e6,
+            summary['min'] * 1e6, summary['max'] * 1e6), file=file)
+        print("  " + ", ".join("<{}us: {}".format(2 * bucket / 1000, count)
+                               for bucket, count in summary['histogram'].items()), file=file)
+    print("Nodes per second: {:.1f}".format(timings['nodes_per_second']), file=file)
+    print("Max frontier: {}".format(timings['max_frontier']), file=file)
+
+
+def print_memory(memory: MemoryUsage, file=sys.stdout) -> None:
+    """Prints the peak memory of the search, the mean size of a node and the
+    frontier size and memory traced at each sample."""
+    print("Peak memory: {} B".format(memory.peak), file=file)
+    if memory.bytes_per_node() is not None:
+        print("Bytes per node: {:.0f}".format(memory.bytes_per_node()), file=file)
+    for expanded, frontier, current in memory.samples:
+        print("  {} expanded: frontier {}, {} B".format(expanded, frontier, current), file=file)
+
+
+def print_search_stats(frontier: FrontierHighWater, branching: BranchingFactor,
+                       file=sys.stdout) -> None:
+    """Prints the largest frontier of the search and, for each depth, the
+    number of nodes expanded there and the effective branching factor."""
+    print("Max frontier: {}".format(frontier.max_size), file=file)
+    factors = branching.factors()
+    for depth, count in sorted(branching.expanded.items()):
+        print("  depth {}: {} expanded, branching {:.2f}".format(
+            depth, count, factors[depth]), file=file)
+
+
+def parse_args(argv=None):
+    # Imported here, so that the modules importing this one don't pay for it
+    import argparse
+    parser = argparse.ArgumentParser(
+        description="Solves the takuzu board read from the standard input.")
+    parser.add_argument('--timings', action='store_true',
+                        help="time each call to the problem's methods")
+    parser.add_argument('--timings-json', metavar='FILE',
+                        help="write the timings (implies --timings) as JSON")
+    parser.add_argument('--max-nodes', metavar='N', type=int,
+                        help="give up after expanding N nodes")
+    parser.add_argument('--timeout', metavar='SECONDS', type=float,
+                        help="give up after SECONDS seconds of search")
+    parser.add_argument('--max-frontier', metavar='N', type=int,
+                        help="give up when the frontier grows beyond N nodes")
+    parser.add_argument('--checkpoint', metavar='FILE',
+                        help="save the search to FILE periodically, on SIGUSR1 "
+                             "and (before exiting) on SIGTERM")
+    parser.add_argument('--checkpoint-every', metavar='N', type=int, default=10000,
+                        help="expansions between checkpoints (default: 10000)")
+    parser.add_argument('--resume', action='store_true',
+                        help="resume the search saved in the --checkpoint FILE")
+    parser.add_argument('--search-stats', action='store_true',
+                        help="print the frontier high-water mark and the "
+                             "branching factor at each depth")
+    parser.add_argument('--memory', action='store_true',
+                        help="report the peak memory, bytes per node and the "
+                             "frontier size over time (with tracemalloc)")
+    parser.add_argument('--memory-interval', metavar='N', type=int, default=100,
+                        help="expansions between memory samples (default: 100)")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="write the search events to FILE as JSON lines")
+    parser.add_argument('--trace-sample', metavar='RATE', type=float, default=1.0,
+                        help="fraction of the search events to trace (default: 1)")
+    parser.add_argument('--profile', metavar='PREFIX',
+                        help="profile the search, writing PREFIX.pstats and "
+                             "PREFIX.folded (collapsed stacks for flame graphs)")
+    parser.add_argument('--profile-mode', choices=('cprofile', 'sample'), default='cprofile',
+                        help="trace every call with cProfile (default) or sample "
+                             "the stack periodically (no pstats)")
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
+    args = parse_args()
+    timed = args.timings or args.timings_json is not None
     board = Board.parse_instance_from_stdin()
     takuzu = Takuzu(board)
-    takuzu = InstrumentedProblem(takuzu)
-    goal = depth_first_tree_search(takuzu)
+    takuzu = InstrumentedProblem(takuzu, timed)
+    hooks = []
+    if args.search_stats:
+        frontier, branching = FrontierHighWater(), BranchingFactor()
+        hooks += [frontier, branching]
+    if args.memory:
+        memory = MemoryUsage(args.memory_interval, node_bytes)
+        hooks.append(memory)
+    if args.trace:
+        trace_file = open(args.trace, 'w')
+        trace = SearchTrace(trace_file, args.trace_sample, h=takuzu.problem.h)
+        hooks.append(trace)
+    if args.profile:
+        from profiling import Profiler
+        profiler = Profiler(args.profile_mode)
+        profiler.start()
+    if args.memory:
+        memory.start()
+    budget = None
+    if (args.max_nodes, args.timeout, args.max_frontier) != (None, None, None):
+        budget = Budget(args.max_nodes, args.timeout, args.max_frontier)
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = Checkpoint(args.checkpoint, args.checkpoint_every, args.resume)
+    with checkpoint or nullcontext():
+        goal = depth_first_tree_search(takuzu, HookList(*hooks) if hooks else None, budget,
+                                       checkpoint)
+    if args.memory:
+        memory.stop()
+    if args.profile:
+        profiler.stop()
+        profiler.write(args.profile)
+    if args.trace:
+        trace.close()
+        trace_file.close()
     if goal:
         print(goal.state.board)
+    elif isinstance(goal, BudgetExhausted):
+        print("Budget exhausted ({}) after {} expansions in {:.3f} s, at depth {} "
+              "with {} nodes in the frontier.".format(
+                  goal.reason, goal.expanded, goal.elapsed, goal.node.depth,
+                  goal.frontier_size))
     else:
-        print('The given takuzu board doesn\'t have a solution.')
+        print(NO_SOLUTION)
     
     print("Gerados: " + str(takuzu.states))
     print("Expandidos: " + str(takuzu.succs))
+    if args.timings:
+        print_timings(takuzu.timings())
+    if args.timings_json:
+        with open(args.timings_json, 'w') as file:
+            json.dump(takuzu.timings(), file, indent=2)
+    if args.search_stats:
+        print_search_stats(frontier, branching)
+    if args.memory:
+        print_memory(memory)
@@ -5,13 +5,30 @@ import collections
 import collections.abc
 import functools
 import heapq
+import importlib
 import operator
 import os.path
 import random
 from itertools import chain, combinations
-from statistics import mean
 
-import numpy as np
+
+class LazyModule:
+    """Stands for the module 'name', which is only imported on the first
+    access to one of its attributes. Importing NumPy takes longer than
+    solving a small puzzle, and most programs never use it."""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+
+    def __getattr__(self, attr):
+        module = importlib.import_module(self._name)
+        # From now on the attributes are found without calling __getattr__
+        self.__dict__.update(vars(module))
+        return getattr(module, attr)
+
+
+np = LazyModule('numpy')
+statistics = LazyModule('statistics')
 
 
 # ______________________________________________________________________________
@@ -244,6 +261,11 @@ def cross_entropy_loss(x, y):
     return (-1.0 / len(x)) * sum(_x * np.log(_y) + (1 - _x) * np.log(1 - _y) for _x, _y in zip(x, y))
 
 
+def mean(data):
+    """The arithmetic mean of 'data' (see statistics.mean)."""
+    return statistics.mean(data)
+
+
 def mean_squared_error_loss(x, y):
     return (1.0 / len(x)) * sum((_x - _y) ** 2 for _x, _y in zip(x, y))
 
@@ -0,0 +1,287 @@
+# vectorized.py: Resolução de muitos tabuleiros pequenos de uma só vez.
+# Os tabuleiros do mesmo tamanho são empilhados num array NumPy
+# (tabuleiros x n x n) e as regras de dedução são aplicadas a todos ao mesmo
+# tempo, até nenhuma regra preencher mais células; só os tabuleiros que ficam
+# por resolver passam pela procura de takuzu.py.
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from takuzu import NO_SOLUTION, Board, solve
+
+EMPTY = Board.EMPTY_CELL
+
+
+def line_rules(lines, zeros, ones, cap: int) -> None:
+    """Marks in 'zeros' and 'ones' the cells which the rules force to 0 or 1,
+    given 'lines', a (boards x lines x cells) array with the cells of each
+    line along its last axis (the rows of the boards, or a transposed view
+    with their columns; 'zeros' and 'ones' are views of the same shape).
+    Cells which are already filled may be marked too."""
+    filled = lines != EMPTY
+    # Two equal adjacent cells: the cells on both sides are the other value
+    pairs = (lines[..., :-1] == lines[..., 1:]) & filled[..., :-1]
+    for value, other in ((0, ones), (1, zeros)):
+        pair = pairs & (lines[..., :-1] == value)
+        other[..., :-2] |= pair[..., 1:]
+        other[..., 2:] |= pair[..., :-1]
+        # Two equal cells with one between them: that one is the other value
+        other[..., 1:-1] |= (lines[..., :-2] == value) & (lines[..., 2:] == value)
+
+    # A line with 'cap' cells with a value has the other value in the rest
+    count0 = (lines == 0).sum(axis=-1)
+    count1 = (lines == 1).sum(axis=-1)
+    ones |= (count0 >= cap)[..., None]
+    zeros |= (count1 >= cap)[..., None]
+
+    # A line with two empty cells, which have to be a 0 and a 1, can't be
+    # completed to equal a full line: the empty cells take the values
+    # opposite to the ones they have in that line
+    empties = lines.shape[-1] - count0 - count1
+    candidates = (empties == 2) & (count0 == cap - 1) & (count1 == cap - 1)
+    full = empties == 0
+    if candidates.any() and full.any():
+        matches = ((lines[:, :, None, :] == lines[:, None, :, :]) |
+                   ~filled[:, :, None, :]).all(axis=-1)
+        matches &= candidates[:, :, None] & full[:, None, :]
+        matched = matches.any(axis=-1)
+        reference = lines[np.arange(len(lines))[:, None], matches.argmax(axis=-1)]
+        ones |= matched[..., None] & (reference == 0)
+        zeros |= matched[..., None] & (reference == 1)
+
+
+def deduce(grids):
+    """Applies the rules to every board of 'grids' (a boards x n x n array,
+    changed in place) until none of them fills any more cells. Returns a
+    boolean array telling which boards reached a contradiction (a cell forced
+    to be both 0 and 1, or a rule broken by the filled cells, see
+    violations): those are left as they were when it was found. The rules are
+    only sound on boards without contradictions."""
+    n = grids.shape[1]
+    cap = (n + 1) // 2
+    contradiction = np.zeros(len(grids), dtype=bool)
+    while True:
+        contradiction |= violations(grids)
+        zeros = np.zeros(grids.shape, dtype=bool)
+        ones = np.zeros(grids.shape, dtype=bool)
+        line_rules(grids, zeros, ones, cap)
+        line_rules(grids.transpose(0, 2, 1), zeros.transpose(0, 2, 1),
+                   ones.transpose(0, 2, 1), cap)
+        empty = grids == EMPTY
+        zeros &= empty
+        ones &= empty
+        contradiction |= (zeros & ones).any(axis=(1, 2))
+        zeros[contradiction] = False
+        ones[contradiction] = False
+        if not (zeros.any() or ones.any()):
+            return contradiction
+        grids[zeros] = 0
+        grids[ones] = 1
+
+
+def violations(grids):
+    """Returns a boolean array telling which boards of 'grids' have filled
+    cells which already break a rule: three equal adjacent cells, more than
+    half (rounded up) of a value in a line, or two equal full rows or
+    columns (told apart by their keys, see line_keys)."""
+    n = grids.shape[1]
+    cap = (n + 1) // 2
+    broken = np.zeros(len(grids), dtype=bool)
+    for lines in (grids, grids.transpose(0, 2, 1)):
+        triples = ((lines[..., :-2] == lines[..., 1:-1]) & (lines[..., 1:-1] == lines[..., 2:]) &
+                   (lines[..., 1:-1] != EMPTY))
+        broken |= triples.any(axis=(1, 2))
+        count0 = (lines == 0).sum(axis=-1)
+        count1 = (lines == 1).sum(axis=-1)
+        broken |= ((count0 > cap) | (count1 > cap)).any(axis=-1)
+        full = count0 + count1 == n
+        keys = np.sort(line_keys(lines, ~full), axis=-1)
+        broken |= (keys[:, 1:] == keys[:, :-1]).any(axis=-1)
+    return broken
+
+
+def first_index(mask):
+    """Returns, for each board of 'mask' (a boards x lines boolean array),
+    the first line where it is True, or -1 if there's none."""
+    return np.where(mask.any(axis=-1), mask.argmax(axis=-1), -1)
+
+
+def line_keys(lines, distinct=None):
+    """Returns a key for each line of 'lines' (a boards x lines x cells array
+    of 0s and 1s), the same for equal lines: its cells packed 8 per byte,
+    viewed as a single bytes (void) value, so lines may have any number of
+    cells. The lines where 'distinct' (a boards x lines boolean array) is
+    True are given keys equal to no other line's."""
+    keys = np.packbits(lines == 1, axis=-1)
+    if distinct is not None:
+        tags = np.where(distinct, np.arange(1, lines.shape[1] + 1, dtype='>u4'), 0).astype('>u4')
+        keys = np.concatenate((keys, tags[..., None].view(np.uint8)), axis=-1)
+    keys = np.ascontiguousarray(keys)
+    return keys.view(np.dtype((np.void, keys.shape[-1])))[..., 0]
+
+
+def duplicated(keys):
+    """Returns a boolean array telling which entries of 'keys' (a boards x
+    lines array) are equal to another one of the same board."""
+    order = keys.argsort(axis=-1, kind='stable')
+    boards = np.arange(len(keys))[:, None]
+    sorted_keys = keys[boards, order]
+    equal = sorted_keys[:, 1:] == sorted_keys[:, :-1]
+    found = np.zeros(keys.shape, dtype=bool)
+    found[:, 1:] |= equal
+    found[:, :-1] |= equal
+    result = np.empty_like(found)
+    result[boards, order] = found
+    return result
+
+
+# The rules checked by validate, in the order they're reported
+RULES = ('empty', 'triple', 'balance', 'duplicate')
+LINES = ('row', 'column')
+
+
+def validate(grids):
+    """Checks whether each board of 'grids' (a boards x n x n array) is a
+    complete solution. Returns a tuple of 4 arrays, with an entry per board:
+    whether it is valid and, if it isn't, its first violation: the rule
+    broken (an index of RULES), the kind of line (an index of LINES) and
+    the index of that line. Rules are checked in the order of RULES, and rows
+    before columns; for valid boards, rule, line and index are -1."""
+    grids = np.asarray(grids, dtype=np.int8)
+    count, n = len(grids), grids.shape[1]
+    cap = (n + 1) // 2
+    rule = np.full(count, -1, dtype=np.int8)
+    line = np.full(count, -1, dtype=np.int8)
+    index = np.full(count, -1, dtype=np.int32)
+    for kind, lines in enumerate((grids, grids.transpose(0, 2, 1))):
+        sums = np.cumsum(lines == 1, axis=-1, dtype=np.int16)
+        windows = sums[..., 2:].copy()
+        windows[..., 1:] -= sums[..., :-3]
+        ones = sums[..., -1]
+        keys = line_keys(lines)
+        checks = ((lines == EMPTY).any(axis=-1),
+                  ((windows == 0) | (windows == 3)).any(axis=-1),
+                  (ones > cap) | (n - ones > cap),
+                  duplicated(keys))
+        for code, mask in enumerate(checks):
+            first = first_index(mask)
+            # Only the first violation of each board counts: earlier rules,
+            # and rows before columns, take precedence
+            found = (first >= 0) & ((rule < 0) | (rule > code))
+            rule[found] = code
+            line[found] = kind
+            index[found] = first[found]
+    return rule < 0, rule, line, index
+
+
+def describe_violation(rule: int, line: int, index: int) -> str:
+    """A description of a violation reported by validate."""
+    if rule < 0:
+        return "valid"
+    return "{} {} {}".format(RULES[rule], LINES[line], index)
+
+
+def valid_full(grids):
+    """Returns a boolean array telling which boards of 'grids' are full and
+    valid (see validate)."""
+    return validate(grids)[0]
+
+
+def solve_vectorized(boards: list, stats=None) -> list:
+    """Solves every board of 'boards' (a list). Returns, for each of them, its
+    solution (a Board) or None if it doesn't have one. The boards of each
+    size are deduced together (see deduce); those left with empty cells are
+    then solved by the search of takuzu.solve, from where the rules left
+    them, and those which reached a contradiction (or an invalid board) are
+    solved from scratch. If 'stats' is a dict, the number of boards solved
+    by the rules alone ('deduced') and by the search ('searched') is added
+    to it."""
+    if stats is None:
+        stats = {}
+    stats.setdefault('deduced', 0)
+    stats.setdefault('searched', 0)
+    solutions = [None] * len(boards)
+    by_size = {}
+    for index, board in enumerate(boards):
+        by_size.setdefault(board.size, []).append(index)
+    for size, indices in by_size.items():
+        grids = np.array([boards[index].board for index in indices], dtype=np.int8)
+        contradiction = deduce(grids)
+        valid = valid_full(grids)
+        for index, grid, failed, done in zip(indices, grids, contradiction, valid):
+            if done:
+                solutions[index] = Board(grid.tolist(), size)
+                stats['deduced'] += 1
+                continue
+            full = not (grid == EMPTY).any()
+            board = boards[index] if failed or full else Board(grid.tolist(), size)
+            goal, _ = solve(board)
+            solutions[index] = goal.state.board if goal else None
+            stats['searched'] += 1
+    return solutions
+
+
+def check_boards(boards: list) -> list:
+    """Validates every board of 'boards' (a list) as a complete solution.
+    Returns, for each of them, the description of its first violation (see
+    validate and describe_violation)."""
+    results = [None] * len(boards)
+    by_size = {}
+    for index, board in enumerate(boards):
+        by_size.setdefault(board.size, []).append(index)
+    for indices in by_size.values():
+        grids = np.array([boards[index].board for index in indices], dtype=np.int8)
+        _, rules, lines, lines_index = validate(grids)
+        for index, rule, line, line_index in zip(indices, rules, lines, lines_index):
+            results[index] = describe_violation(rule, line, line_index)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Solves the takuzu boards read from the standard input, "
+                    "applying the deduction rules to many boards at a time.")
+    parser.add_argument('--batch-size', type=int, default=4096,
+                        help="number of boards deduced together")
+    parser.add_argument('--corpus', metavar='FILE',
+                        help="read the boards from a binary corpus (see corpus.py) "
+                             "instead of the standard input")
+    parser.add_argument('--validate', action='store_true',
+                        help="check whether the boards are complete solutions, "
+                             "printing the first violation of each, instead of solving them")
+    parser.add_argument('--quiet', action='store_true',
+                        help="don't report how many boards were deduced")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    start = time.perf_counter()
+    if args.corpus:
+        from corpus import Corpus
+        boards = iter(Corpus(args.corpus))
+    else:
+        boards = Board.parse_instances(sys.stdin)
+    stats = {}
+    total = 0
+    while True:
+        chunk = [board for _, board in zip(range(args.batch_size), boards)]
+        if not chunk:
+            break
+        if args.validate:
+            for result in check_boards(chunk):
+                print(result)
+        else:
+            for solution in solve_vectorized(chunk, stats):
+                print((str(solution) if solution else NO_SOLUTION) + "\n")
+        total += len(chunk)
+    if not args.quiet:
+        elapsed = time.perf_counter() - start
+        summary = "Total: {} boards in {:.3f} s ({:.1f} boards/s)".format(
+            total, elapsed, total / elapsed if elapsed else float('inf'))
+        if stats:
+            summary += ", {} deduced, {} searched".format(stats['deduced'], stats['searched'])
+        print(summary, file=sys.stderr)